@@ -46,7 +46,7 @@ def inject_now():
 BASE_DIR = Path(__file__).resolve().parent
 app.config['UPLOAD_FOLDER'] = BASE_DIR / 'uploads'
 app.config['OUTPUT_FOLDER'] = BASE_DIR / 'output'
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100 MB limit
+app.config['MAX_CONTENT_LENGTH'] = pdf_operations.MAX_PDF_BYTES  # 100 MB limit, same as the per-PDF limit in pdf_operations
 
 try:
     gemini_processors.configure_gemini()
@@ -134,18 +134,15 @@ def handle_file_upload(request_files_key, allowed_extensions, multi=False):
              return None, None, 0, "Failed to process the uploaded file."
 
 
-def save_temp_file(stream, filename):
-    """Saves a stream temporarily to the UPLOAD_FOLDER for tools needing a file path."""
-    temp_dir = Path(app.config['UPLOAD_FOLDER'])
+def save_temp_file(stream, filename, temp_dir=None):
+    """Saves a stream temporarily to temp_dir (default UPLOAD_FOLDER) for tools needing a file path."""
+    temp_dir = Path(temp_dir or app.config['UPLOAD_FOLDER'])
     # temp_dir.mkdir(parents=True, exist_ok=True) # Already done at startup
    
-    temp_filename = secure_filename(f"{Path(filename).stem}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{Path(filename).suffix}")
+    temp_filename = secure_filename(f"{Path(filename).stem}_{pdf_operations.unique_suffix()}{Path(filename).suffix}")
     temp_filepath = temp_dir / temp_filename
     try:
-        stream.seek(0) # Ensure stream is at the beginning
-        with open(temp_filepath, 'wb') as f:
-            f.write(stream.read())
-        stream.seek(0) # Reset stream pointer
+        pdf_operations.copy_stream_to_file(stream, temp_filepath) # No full in-memory copy of the upload
         logger.info(f"Saved temporary file for processing: {temp_filepath}")
         return temp_filepath
     except Exception as e:
@@ -236,7 +233,8 @@ def summarize_route():
             if stream: stream.close()
             return redirect(url_for('ai_tools_page'))
 
-        temp_pdf_path = save_temp_file(stream, filename)
+        # Only read back locally for text extraction/OCR, so it can live on tmpfs
+        temp_pdf_path = save_temp_file(stream, filename, pdf_operations.scratch_dir(file_size))
         if not temp_pdf_path:
              flash("Failed to save uploaded file for processing.", "error")
              return redirect(url_for('ai_tools_page'))
@@ -339,7 +337,8 @@ def translate_route():
             if stream: stream.close()
             return redirect(url_for('ai_tools_page'))
 
-        temp_pdf_path = save_temp_file(stream, filename)
+        # Only read back locally for text extraction/OCR, so it can live on tmpfs
+        temp_pdf_path = save_temp_file(stream, filename, pdf_operations.scratch_dir(file_size))
         if not temp_pdf_path:
              flash("Failed to save uploaded file for processing.", "error")
              return redirect(url_for('ai_tools_page'))
@@ -374,7 +373,7 @@ def translate_route():
 
                 if translated_text and not translated_text.startswith("Error:"):
                     output_filename_base = Path(filename).stem
-                    safe_lang_name = "".join(c if c.isalnum() else '_' for c in target_language_name_for_template).lower()
+                    safe_lang_name = pdf_operations.safe_filename_part(target_language_name_for_template).lower()
                     
                     # 1. Generate TXT file
                     try:
@@ -845,7 +844,6 @@ def pdf_to_excel_route():
 def pdf_to_image_route():
     stream = None
     filename = "N/A"
-    temp_pdf_path = None
     output_paths = []
     zip_file_path_obj = None
 
@@ -878,7 +876,7 @@ def pdf_to_image_route():
 
         fmt = request.form.get('format', 'jpeg')
         dpi = request.form.get('dpi', 200, type=int)
-        # ... (rest of pdf-to-image logic: validate fmt/dpi, save temp, call pdf_to_images, handle single/zip output)
+        # ... (rest of pdf-to-image logic: validate fmt/dpi, call pdf_to_images, handle single/zip output)
         if fmt not in ['jpeg', 'png']:
             flash("Invalid image format selected.", 'error')
             return redirect(url_for('pdf_tools_page'))
@@ -887,13 +885,8 @@ def pdf_to_image_route():
              return redirect(url_for('pdf_tools_page'))
 
         base_name = Path(filename).stem
-        temp_pdf_path = save_temp_file(stream, filename)
-        if not temp_pdf_path:
-             flash("Failed to save uploaded file for processing.", "error")
-             return redirect(url_for('pdf_tools_page'))
-
         logger.info(f"Processing pdf-to-image request for '{filename}' (fmt: {fmt}, dpi: {dpi}).")
-        output_paths, error_msg = pdf_operations.pdf_to_images(str(temp_pdf_path), fmt=fmt, dpi=dpi, output_filename_base=base_name)
+        output_paths, error_msg = pdf_operations.pdf_to_images(stream, fmt=fmt, dpi=dpi, output_filename_base=base_name) # Pass stream
 
         if error_msg:
             flash(f"PDF to Image conversion failed: {error_msg}", 'error')
@@ -934,7 +927,6 @@ def pdf_to_image_route():
         if stream:
              try: stream.close()
              except Exception: pass
-        cleanup_temp_file(temp_pdf_path)
         if zip_file_path_obj and zip_file_path_obj.exists():
             logger.info("Cleaning up individual image files after zipping.")
             for img_path in output_paths:
@@ -1085,10 +1077,14 @@ def download_file(filename):
         session.pop('download_file', None)
         session.pop('download_filename', None)
 
+        # Conditional response: ETag/Last-Modified let a repeated download be answered with a 304
         return send_from_directory(
             directory=output_dir,
             path=safe_filename, # Use the secured filename
-            as_attachment=True
+            as_attachment=True,
+            conditional=True,
+            etag=True,
+            last_modified=file_path.stat().st_mtime
             )
     except FileNotFoundError:
         logger.error(f"File not found for download: {file_path}")
@@ -4,20 +4,28 @@
 import os
 import re
 import io
+import collections
+import functools
+import hashlib
+import itertools
+import math
 import zipfile
 import fitz 
 from fitz.utils import getColor
-import os 
-from pathlib import Path 
 import warnings
 import logging
+import shutil
 import subprocess
+import tempfile
+import threading
+import atexit
+import time
 from datetime import datetime
 from pathlib import Path
-from pypdf import PdfReader, PdfWriter
-from pypdf.errors import PdfReadError, FileNotDecryptedError
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import pikepdf
 from PIL import Image
-from pdf2image import convert_from_path
 from docx import Document
 from docx.shared import Inches
 
@@ -29,12 +37,30 @@ except ImportError:
     logging.warning("python-docx library not found. PDF-to-Word functionality will be disabled.")
     DOCX_AVAILABLE = False
 
+try:
+    import img2pdf
+    IMG2PDF_AVAILABLE = True
+except ImportError:
+    logging.info("img2pdf not found. Image-to-PDF will re-encode images with Pillow.")
+    IMG2PDF_AVAILABLE = False
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+    from com.sun.star.lang import DisposedException
+    UNO_AVAILABLE = True
+except ImportError:
+    logging.info("python-uno not found. Office-to-PDF will start a LibreOffice process per conversion.")
+    UNO_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 OUTPUT_DIR = Path("output")
-POPPLER_PATH = os.environ.get('POPPLER_PATH', None)
-warnings.filterwarnings("ignore", category=UserWarning, module='pypdf')
+MAX_PDF_BYTES = 100 * 1024 * 1024 # Inputs above this are rejected before any parsing; app.py uses it as MAX_CONTENT_LENGTH
+SCRATCH_DIR = Path("/dev/shm") # RAM-backed tmpfs for short-lived working copies, used when present
+warnings.filterwarnings("ignore", category=UserWarning, module='pikepdf')
 
 # --- Helper Functions ---
 def ensure_output_dir():
@@ -42,100 +68,282 @@ def ensure_output_dir():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     # logger.info(f"Ensured output directory exists: {OUTPUT_DIR.resolve()}") # Optional logging
 
+# Maps every Latin-1 character that isn't alphanumeric, '_' or '-' to '_' in a single str.translate call
+_FILENAME_TRANS = str.maketrans({c: '_' for c in map(chr, range(256)) if not (c.isalnum() or c in '_-')})
+_FILENAME_SCRUB = re.compile(r'[^\w\-]').sub # Unicode \w is str.isalnum() plus '_'
+_filename_counter = itertools.count()
+_filename_stamp = None
+_filename_stamp_pid = None
+
+def _output_stamp():
+    """Returns this process's start timestamp plus its pid, computed once per process
+       (and again after a fork, so worker processes don't share the parent's stamp).
+    """
+    global _filename_stamp, _filename_stamp_pid
+    pid = os.getpid()
+    if _filename_stamp_pid != pid:
+        _filename_stamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{pid}"
+        _filename_stamp_pid = pid
+    return _filename_stamp
+
+def unique_suffix():
+    """Returns '<process stamp>_<counter>', unique across calls, threads and worker processes."""
+    return f"{_output_stamp()}_{next(_filename_counter)}"
+
+def safe_filename_part(text):
+    """Replaces every character that isn't alphanumeric, '_' or '-' with '_'."""
+    safe = str(text).translate(_FILENAME_TRANS)
+    if not safe.isascii() and max(safe) > '\xff': # Outside the table, scrub the rest with the regex
+        safe = _FILENAME_SCRUB('_', safe)
+    return safe
+
 def get_output_filename(base_name, suffix, extension):
-    """Generates a unique output filename in the OUTPUT_DIR."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f") # Added microseconds
-    safe_base = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in str(base_name))
+    """Generates a unique output filename in the OUTPUT_DIR.
+       Uniqueness comes from a per-process stamp and counter instead of formatting the clock per call.
+    """
     max_base_len = 100
-    safe_base = safe_base[:max_base_len]
-    filename = f"{safe_base}_{suffix}_{timestamp}{extension}"
+    safe_base = safe_filename_part(str(base_name)[:max_base_len]) # 1:1 mapping, so slice first
+    filename = f"{safe_base}_{suffix}_{unique_suffix()}{extension}"
     return OUTPUT_DIR / filename
 
+def _stream_size(stream):
+    """Returns the total size of a stream without reading it (fstat for real files, else a seek to the end)."""
+    try:
+        return os.fstat(stream.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(0)
+        return size
+
+def _load_bytes(stream):
+    """Returns the whole stream as bytes, read once and rewound for the caller.
+       For BytesIO uploads the existing buffer is shared instead of copied.
+    """
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    stream.seek(0)
+    data = stream.read()
+    stream.seek(0)
+    return data
+
+def copy_stream_to_file(stream, path):
+    """Copies a whole input stream into a new file at path, rewinds the stream and returns the size.
+       BytesIO buffers are written straight from memory, streams over a named file are hard-linked
+       (no data copied at all), other real files go through os.sendfile (kernel-side copy), and
+       anything else is copied in 1 MB chunks. The payload is never staged in a Python bytes object.
+    """
+    name = getattr(stream, 'name', None)
+    if not isinstance(stream, io.BytesIO) and isinstance(name, str) and os.path.isfile(name):
+        try:
+            os.link(name, path)
+            return os.stat(path).st_size
+        except OSError:
+            pass # Other filesystem or no link support, copy below
+    with open(path, 'wb', buffering=0) as f:
+        if isinstance(stream, io.BytesIO):
+            f.write(stream.getbuffer())
+        else:
+            stream.seek(0)
+            try:
+                src_fd = stream.fileno()
+                size = os.fstat(src_fd).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(f.fileno(), src_fd, offset, size - offset)
+                    if sent == 0: break
+                    offset += sent
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                stream.seek(0)
+                f.seek(0)
+                f.truncate()
+                shutil.copyfileobj(stream, f, 1 << 20)
+        size = os.fstat(f.fileno()).st_size
+    try:
+        stream.seek(0)
+    except (OSError, ValueError):
+        pass # Caller already consumed or closed the stream, the file on disk is what matters
+    return size
+
+def scratch_dir(size_hint=0):
+    """Returns the directory for short-lived working copies of uploads.
+       Uses the tmpfs at SCRATCH_DIR when it is writable and has room for twice size_hint
+       (container /dev/shm is often small), otherwise None so callers keep their own default.
+       Never OUTPUT_DIR: files there are served by /download.
+    """
+    try:
+        if SCRATCH_DIR.is_dir() and os.access(SCRATCH_DIR, os.W_OK):
+            st = os.statvfs(SCRATCH_DIR)
+            if st.f_bavail * st.f_frsize >= 2 * size_hint:
+                return SCRATCH_DIR
+    except (OSError, AttributeError):
+        pass # statvfs is missing on Windows
+    return None
+
+def write_output_file(output_path, data):
+    """Writes a fully serialized output file in one pass.
+       Where available (Linux), the file is preallocated to its final size with posix_fallocate
+       first, so the filesystem reserves the extents once instead of growing the file per write.
+       The data goes to a temporary file next to output_path that is renamed into place with
+       os.replace, so a failed write never leaves a partial file under the final name.
+    """
+    view = memoryview(data)
+    fd, tmp_path = tempfile.mkstemp(dir=Path(output_path).parent, prefix=".partial_")
+    try:
+        try:
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, 0o644) # mkstemp creates 0600, outputs are served by the app
+            if hasattr(os, "posix_fallocate") and len(view):
+                try:
+                    os.posix_fallocate(fd, 0, len(view))
+                except OSError:
+                    pass # Not supported by this filesystem, plain writes still work
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
 # --- Core PDF Operations ---
 
 
+MERGE_FILES_PER_WORKER = 8 # Below this many inputs per worker the process pool isn't worth starting
+
+def _merge_pdf_group(inputs, output_path):
+    """Merges (label, source) pairs in order with pikepdf, skipping unreadable or encrypted inputs.
+       A source is a file path (read natively by qpdf) or the PDF bytes. Runs inside a worker process
+       for large merges. Saves straight to output_path and returns it (None if no input could be read,
+       nothing is written then) with the number of inputs used.
+    """
+    sources = [] # Kept open until the merged file is saved, pikepdf copies their objects lazily
+    processed_count = 0
+    try:
+        with pikepdf.Pdf.new() as merged:
+            for filename_for_log, source in inputs:
+                try:
+                    # Opens files with an empty user password as well; BytesIO shares the bytes, no copy
+                    src = pikepdf.Pdf.open(source if isinstance(source, str) else io.BytesIO(source))
+                    sources.append(src)
+                    merged.pages.extend(src.pages)
+                    processed_count += 1
+                    # logger.info(f"Appended '{filename_for_log}' to merge.") # Verbose logging
+                except pikepdf.PasswordError:
+                    logger.warning(f"Skipping encrypted file (password needed): {filename_for_log}")
+                    continue # Skip this file
+                except pikepdf.PdfError as read_err:
+                     logger.error(f"Error reading PDF stream '{filename_for_log}': {read_err}. Skipping.")
+                     continue # Skip invalid PDF
+                except Exception as e:
+                    logger.error(f"Unexpected error processing stream '{filename_for_log}' for merge: {e}. Skipping.", exc_info=True)
+                    continue # Skip on other errors
+
+            if processed_count < 1:
+                return None, 0
+            try:
+                merged.save(str(output_path))
+            except BaseException:
+                cleanup_temp_file(output_path)
+                raise
+            return output_path, processed_count
+    finally:
+        for src in sources:
+            src.close()
+
 def merge_pdfs(pdf_files, output_filename_base="merged"):
-    """Merges multiple PDF file streams into one."""
+    """Merges multiple PDF file streams into one.
+       Pages are spliced with pikepdf (libqpdf). Large merges are reduced in two levels: groups of
+       inputs are merged in parallel worker processes, then the partial PDFs are joined in order.
+    """
     ensure_output_dir()
-    merger = PdfWriter()
-    processed_count = 0
+    group_paths = []
     try:
+        inputs = []
+        total_size = 0
         for pdf_stream in pdf_files:
             filename_for_log = getattr(pdf_stream, 'filename', 'N/A')
-            try:
-                reader = PdfReader(pdf_stream)
-                if reader.is_encrypted:
-                    try:
-                        if reader.decrypt('') == 0: # Try empty password
-                             logger.warning(f"Skipping encrypted file (password needed): {filename_for_log}")
-                             continue # Skip this file
-                    except FileNotDecryptedError:
-                        logger.warning(f"Skipping encrypted file (password needed): {filename_for_log}")
-                        continue # Skip this file
-                    except Exception as decrypt_err:
-                         logger.warning(f"Skipping file {filename_for_log} due to decryption check error: {decrypt_err}")
-                         continue
-
-                merger.append(reader)
-                processed_count += 1
-                # logger.info(f"Appended '{filename_for_log}' to merge.") # Verbose logging
-            except PdfReadError as read_err:
-                 logger.error(f"Error reading PDF stream '{filename_for_log}': {read_err}. Skipping.")
-                 continue # Skip invalid PDF
-            except Exception as e:
-                logger.error(f"Unexpected error processing stream '{filename_for_log}' for merge: {e}. Skipping.", exc_info=True)
-                continue # Skip on other errors
+            size = _stream_size(pdf_stream)
+            if size > MAX_PDF_BYTES:
+                logger.warning(f"Skipping {filename_for_log}: {size} bytes exceeds the {MAX_PDF_BYTES} byte limit.")
+                continue
+            total_size += size
+            if isinstance(pdf_stream, io.BufferedReader) and isinstance(pdf_stream.name, str) and os.path.isfile(pdf_stream.name):
+                # File-backed stream: hand qpdf the path so it reads through the page cache
+                # itself instead of calling back into Python for every read
+                inputs.append((filename_for_log, pdf_stream.name))
+            else:
+                inputs.append((filename_for_log, _load_bytes(pdf_stream)))
 
-        if processed_count < 1:
+        output_path = get_output_filename(output_filename_base, "merged", ".pdf")
+        workers = min(os.cpu_count() or 1, max(1, len(inputs) // MERGE_FILES_PER_WORKER))
+        if workers == 1:
+            merged_path, processed_count = _merge_pdf_group(inputs, output_path)
+        else:
+            chunk = math.ceil(len(inputs) / workers)
+            groups = [inputs[i:i + chunk] for i in range(0, len(inputs), chunk)]
+            # Each group is saved to its own scratch file, so no partial PDF travels back through the pool
+            group_dir = scratch_dir(total_size)
+            for _ in groups:
+                fd, path = tempfile.mkstemp(prefix="merge_group_", suffix=".pdf", dir=group_dir)
+                os.close(fd)
+                group_paths.append(path)
+            logger.info(f"Merging {len(inputs)} files in {len(groups)} parallel group(s).")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                partials = list(executor.map(_merge_pdf_group, groups, group_paths)) # map keeps group order
+            processed_count = sum(count for _, count in partials)
+            parts = [(f"merge group {i + 1}", path) for i, (path, _) in enumerate(partials) if path]
+            merged_path = _merge_pdf_group(parts, output_path)[0] if parts else None
+
+        if processed_count < 1 or merged_path is None:
             return None, "No valid PDF files could be processed for merging."
 
-        output_path = get_output_filename(output_filename_base, "merged", ".pdf")
-        with open(output_path, "wb") as f_out:
-            merger.write(f_out)
-        merger.close()
         logger.info(f"Successfully merged {processed_count} files into {output_path}")
         return output_path, None
     except Exception as e:
         logger.error(f"Error during final merge write operation: {e}", exc_info=True)
-        if merger: merger.close()
         return None, f"Error finalizing merged PDF: {e}"
+    finally:
+        for path in group_paths: cleanup_temp_file(path)
+
 
 
+_RANGE_PART_RE = re.compile(r'(\d*)\s*(?:(-)\s*(\d*))?')
+_RANGE_LABEL_RE = re.compile(r'[^\w\-]+')
 
 def parse_page_ranges(ranges_str, total_pages):
     """Parses a range string (e.g., '1-3, 5, 8-') into a list of tuples.
-       Each tuple contains: (range_string_part, list_of_0_based_indices).
+       Each tuple contains: (range_string_part, range_of_0_based_indices).
        Returns None, error_message if parsing fails.
     """
     if not ranges_str:
         return None, "Page range string cannot be empty."
 
     parsed_ranges = []
-    parts = ranges_str.split(',')
-
-    for part in parts:
+    for part in ranges_str.split(','):
         part = part.strip()
         if not part: continue
 
-        indices = set()
         try:
-            if '-' in part:
-                start_str, end_str = part.split('-', 1)
+            match = _RANGE_PART_RE.fullmatch(part)
+            if not match:
+                raise ValueError(f"'{part}' is not a page number or range.")
+            start_str, dash, end_str = match.groups()
+            if dash:
                 start = int(start_str) if start_str else 1
                 end = int(end_str) if end_str else total_pages
                 if not (1 <= start <= end <= total_pages):
                     raise ValueError(f"Range '{part}' is invalid for page count {total_pages}.")
-                indices.update(range(start - 1, end))
             else:
-                page_num = int(part)
-                if not (1 <= page_num <= total_pages):
+                start = end = int(start_str)
+                if not (1 <= start <= total_pages):
                     raise ValueError(f"Page number '{part}' is out of bounds (1-{total_pages}).")
-                indices.add(page_num - 1)
 
-            if indices:
-                # Sanitize part string for use in filenames
-                safe_part_str = re.sub(r'[^\w\-]+', '_', part)
-                parsed_ranges.append((safe_part_str, sorted(list(indices))))
+            # Each part is one contiguous run, kept as a range object (constant size, cheap to pickle
+            # to split workers); the part string is sanitized for use in filenames
+            parsed_ranges.append((_RANGE_LABEL_RE.sub('_', part), range(start - 1, end)))
 
         except ValueError as ve:
             logger.error(f"Invalid page range format: {ve}")
@@ -147,34 +355,39 @@ def parse_page_ranges(ranges_str, total_pages):
     return parsed_ranges, None
 
 # (Paste the split_pdf_to_multiple_files function from previous answer here)
+def _write_one_split(pdf_bytes, indices, output_path):
+    """Writes the pages at indices (0-based) of pdf_bytes to output_path.
+       Runs inside a worker process, which opens its own pikepdf copy of the source.
+    """
+    with pikepdf.Pdf.open(io.BytesIO(pdf_bytes)) as src, pikepdf.Pdf.new() as dst:
+        for index in indices:
+            dst.pages.append(src.pages[index]) # parse_page_ranges already bounds-checked
+        buffer = io.BytesIO()
+        dst.save(buffer)
+    write_output_file(output_path, buffer.getbuffer())
+
 def split_pdf_to_multiple_files(pdf_file_stream, ranges_str, output_filename_base="split"):
     """Splits a PDF based on page ranges into MULTIPLE output PDF files.
+       Pages are appended to each output with pikepdf, which copies the referenced objects
+       with qpdf instead of rebuilding every page through pypdf. Multiple ranges are written
+       in parallel worker processes, since serializing and compressing each output is CPU-bound.
        Returns a list of output file paths, or None and an error message.
     """
     ensure_output_dir()
     output_paths = []
-    reader = None
     filename_for_log = getattr(pdf_file_stream, 'filename', 'N/A')
 
     try:
-        # Ensure stream is at the beginning before reading
-        pdf_file_stream.seek(0)
-        reader = PdfReader(pdf_file_stream)
-        pdf_file_stream.seek(0) # Reset stream just in case reader consumes it
-
-        if reader.is_encrypted:
-            try:
-                # Try decrypting with empty password. If it requires a password, fail.
-                if reader.decrypt('') == 0:
-                    err_msg = f"Error: Input PDF '{filename_for_log}' is password protected."
-                    logger.error(err_msg)
-                    return None, err_msg
-            except FileNotDecryptedError:
-                 err_msg = f"Error: Input PDF '{filename_for_log}' is password protected."
-                 logger.error(err_msg)
-                 return None, err_msg
+        # Buffer the input once, every worker opens its own copy from these bytes
+        pdf_bytes = _load_bytes(pdf_file_stream)
+        try:
+            with pikepdf.Pdf.open(io.BytesIO(pdf_bytes)) as src: # Opens files with an empty user password as well
+                total_pages = len(src.pages)
+        except pikepdf.PasswordError:
+            err_msg = f"Error: Input PDF '{filename_for_log}' is password protected."
+            logger.error(err_msg)
+            return None, err_msg
 
-        total_pages = len(reader.pages)
         logger.info(f"Processing multi-split for '{filename_for_log}' ({total_pages} pages) with ranges '{ranges_str}'.")
 
         # Use the parser helper function
@@ -191,46 +404,38 @@ def split_pdf_to_multiple_files(pdf_file_stream, ranges_str, output_filename_bas
             logger.warning("No valid ranges resulted in pages to extract.")
             return [], None # Return empty list if no ranges valid
 
-        # Loop through each parsed range part
+        jobs = []
         for range_label, indices in parsed_ranges:
             if not indices: continue # Skip empty index lists
-
-            writer = PdfWriter()
-            logger.info(f"Creating split file for range '{range_label}' with pages (0-based): {indices}")
-            for index in indices:
-                try:
-                    # Add page *from the original reader*
-                    writer.add_page(reader.pages[index])
-                except IndexError:
-                     logger.error(f"Page index {index} out of bounds for PDF {filename_for_log}. Skipping page.")
-                     continue # Skip invalid index
-
-            if not writer.pages:
-                logger.warning(f"No valid pages added for range '{range_label}'. Skipping file creation.")
-                continue # Don't create an empty PDF
-
             split_suffix = f"split_{range_label}"
             output_path = get_output_filename(output_filename_base, split_suffix, ".pdf")
+            logger.info(f"Creating split file for range '{range_label}' with pages {indices.start + 1}-{indices.stop}.")
+            jobs.append((range_label, indices, output_path))
 
-            try:
-                with open(output_path, "wb") as f_out:
-                    writer.write(f_out)
-                writer.close()
-                output_paths.append(output_path)
-                logger.info(f"Created split file: {output_path}")
-            except Exception as write_err:
-                logger.error(f"Failed to write split file for range {range_label}: {write_err}", exc_info=True)
-                if writer: writer.close()
-                # Cleanup already created files before returning error
-                for p in output_paths:
-                     try: os.remove(p)
-                     except OSError: pass
-                return None, f"Error writing split file for range {range_label}: {write_err}"
-
+        workers = min(len(jobs), os.cpu_count() or 1)
+        try:
+            if workers <= 1:
+                for range_label, indices, output_path in jobs:
+                    _write_one_split(pdf_bytes, indices, output_path)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(_write_one_split, pdf_bytes, indices, output_path)
+                               for _, indices, output_path in jobs]
+                    for future in futures:
+                        if future.exception() is not None:
+                            for pending in futures: pending.cancel() # Don't start ranges that are still queued
+                            future.result() # Re-raise in this process
+        except Exception as write_err:
+            logger.error(f"Failed to write split files: {write_err}", exc_info=True)
+            # Cleanup already created files before returning error
+            for _, _, output_path in jobs: cleanup_temp_file(output_path)
+            return None, f"Error writing split files: {write_err}"
+
+        output_paths = [output_path for _, _, output_path in jobs] # Range order, as submitted
         logger.info(f"Successfully created {len(output_paths)} split PDF file(s).")
         return output_paths, None
 
-    except (PdfReadError, ValueError, Exception) as e:
+    except Exception as e:
         logger.error(f"Error during multi-split PDF process for {filename_for_log}: {e}", exc_info=True)
         # Cleanup any files created before the error
         for p in output_paths:
@@ -250,37 +455,29 @@ def rotate_pdf(pdf_file_stream, rotation_angle, output_filename_base="rotated"):
         logger.error(f"Invalid rotation angle specified: {rotation_angle}")
         return None, "Error: Rotation angle must be 90, 180, or 270."
 
-    writer = PdfWriter()
     filename_for_log = getattr(pdf_file_stream, 'filename', 'N/A')
     try:
-        pdf_file_stream.seek(0) # Ensure stream is at start
-        reader = PdfReader(pdf_file_stream)
-        pdf_file_stream.seek(0) # Reset
+        pdf_bytes = _load_bytes(pdf_file_stream)
+        try:
+            pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes)) # Opens files with an empty user password as well
+        except pikepdf.PasswordError:
+            logger.error(f"Cannot rotate password-protected PDF: {filename_for_log}")
+            return None, f"Error: Input PDF '{filename_for_log}' is password protected."
 
-        if reader.is_encrypted:
-            try:
-                if reader.decrypt('') == 0:
-                    logger.error(f"Cannot rotate password-protected PDF: {filename_for_log}")
-                    return None, f"Error: Input PDF '{filename_for_log}' is password protected."
-            except FileNotDecryptedError:
-                logger.error(f"Cannot rotate password-protected PDF: {filename_for_log}")
-                return None, f"Error: Input PDF '{filename_for_log}' is password protected."
-
-        logger.info(f"Rotating {len(reader.pages)} pages in {filename_for_log} by {rotation_angle} degrees.")
-        for page in reader.pages:
-            page.rotate(rotation_angle)
-            writer.add_page(page)
-
-        output_path = get_output_filename(output_filename_base, f"rotated_{rotation_angle}", ".pdf")
-        with open(output_path, "wb") as f_out:
-            writer.write(f_out)
-        writer.close()
+        with pdf:
+            logger.info(f"Rotating {len(pdf.pages)} pages in {filename_for_log} by {rotation_angle} degrees.")
+            for page in pdf.pages:
+                page.rotate(rotation_angle, relative=True)
+
+            output_path = get_output_filename(output_filename_base, f"rotated_{rotation_angle}", ".pdf")
+            buffer = io.BytesIO()
+            pdf.save(buffer)
+        write_output_file(output_path, buffer.getbuffer())
         logger.info(f"Rotated PDF saved to: {output_path}")
         return output_path, None
 
     except Exception as e:
         logger.error(f"Error rotating PDF {filename_for_log}: {e}", exc_info=True)
-        if writer: writer.close()
         return None, f"Error rotating PDF: {e}"
 # --- END ROTATE PDF ---
 
@@ -288,47 +485,34 @@ def rotate_pdf(pdf_file_stream, rotation_angle, output_filename_base="rotated"):
 # --- PROTECT PDF ---
 # (Paste the working add_password function definition from previous answer here)
 def add_password(pdf_file_stream, password, output_filename_base="protected"):
-    """Adds a user password to encrypt the PDF stream."""
+    """Adds a user password to encrypt the PDF stream (AES-256, done natively by qpdf)."""
     ensure_output_dir()
     if not password:
         logger.error("Password cannot be empty for protection.")
         return None, "Error: Password cannot be empty."
 
-    writer = PdfWriter()
     filename_for_log = getattr(pdf_file_stream, 'filename', 'N/A')
     try:
-        pdf_file_stream.seek(0) # Ensure stream is at start
-        reader = PdfReader(pdf_file_stream)
-        pdf_file_stream.seek(0) # Reset
-
-        if reader.is_encrypted:
+        pdf_bytes = _load_bytes(pdf_file_stream)
+        try:
+            pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
+        except pikepdf.PasswordError:
+            pdf = None
+        if pdf is None or pdf.is_encrypted:
+            if pdf is not None: pdf.close()
             logger.warning(f"Input PDF {filename_for_log} is already password protected.")
             return None, "Error: Input PDF is already password protected."
 
-        for page in reader.pages:
-            writer.add_page(page)
-
-        logger.info(f"Encrypting PDF {filename_for_log} with AES-256.")
-        writer.encrypt(user_password=password, algorithm="AES-256") # Requires 'cryptography' package
-
-        output_path = get_output_filename(output_filename_base, "protected", ".pdf")
-        with open(output_path, "wb") as f_out:
-            writer.write(f_out)
-        writer.close()
+        with pdf:
+            logger.info(f"Encrypting PDF {filename_for_log} with AES-256.")
+            output_path = get_output_filename(output_filename_base, "protected", ".pdf")
+            buffer = io.BytesIO()
+            pdf.save(buffer, encryption=pikepdf.Encryption(owner=password, user=password, R=6)) # R=6 is AES-256
+        write_output_file(output_path, buffer.getbuffer())
         logger.info(f"Successfully protected PDF saved to: {output_path}")
         return output_path, None
-    except ImportError as imp_err:
-         # Specifically catch if cryptography is missing
-         if 'cryptography' in str(imp_err):
-             logger.error("Cryptography package needed for AES encryption is not installed. Install it via pip.", exc_info=True)
-             return None, "Error: Required 'cryptography' library not found. Cannot protect with AES."
-         else:
-              logger.error(f"Import error during password addition for {filename_for_log}: {imp_err}", exc_info=True)
-              if writer: writer.close()
-              return None, f"Error adding password (import issue): {imp_err}"
     except Exception as e:
         logger.error(f"Error adding password to {filename_for_log}: {e}", exc_info=True)
-        if writer: writer.close()
         return None, f"Error adding password: {e}"
 # --- END PROTECT PDF ---
 
@@ -341,46 +525,149 @@ def remove_password(pdf_file_stream, password, output_filename_base="unlocked"):
     if not password:
         return None, "Error: Password needed to unlock."
 
-    writer = PdfWriter()
     filename_for_log = getattr(pdf_file_stream, 'filename', 'N/A')
     try:
-        pdf_file_stream.seek(0) # Ensure stream is at start
-        reader = PdfReader(pdf_file_stream)
-        pdf_file_stream.seek(0) # Reset
-
-        if not reader.is_encrypted:
-            logger.warning(f"PDF {filename_for_log} is not password protected.")
-            return None, "Error: PDF is not password protected."
-
+        pdf_bytes = _load_bytes(pdf_file_stream)
         logger.info(f"Attempting to decrypt {filename_for_log}...")
-        if reader.decrypt(password) == 0: # 0 means decryption failed
-             logger.error(f"Incorrect password provided for {filename_for_log}")
-             return None, "Error: Incorrect password provided."
-        # Decryption successful if it returns 1 or 2
-        logger.info(f"Decryption successful for {filename_for_log}.")
-
-        # Clone the decrypted content
-        writer.clone_document_from_reader(reader)
-
-        output_path = get_output_filename(output_filename_base, "unlocked", ".pdf")
-        with open(output_path, "wb") as f_out:
-            writer.write(f_out)
-        writer.close()
+        try:
+            pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes), password=password)
+        except pikepdf.PasswordError:
+            logger.error(f"Incorrect password provided for {filename_for_log}")
+            return None, "Error: Incorrect password provided."
+
+        with pdf:
+            if not pdf.is_encrypted:
+                logger.warning(f"PDF {filename_for_log} is not password protected.")
+                return None, "Error: PDF is not password protected."
+            logger.info(f"Decryption successful for {filename_for_log}.")
+
+            output_path = get_output_filename(output_filename_base, "unlocked", ".pdf")
+            buffer = io.BytesIO()
+            pdf.save(buffer) # Saving without an encryption argument drops the encryption
+        write_output_file(output_path, buffer.getbuffer())
         logger.info(f"Unlocked PDF saved to: {output_path}")
         return output_path, None
 
-    except FileNotDecryptedError: # Catch specifically if decrypt fails strongly
-         logger.error(f"Incorrect password provided (FileNotDecryptedError) for {filename_for_log}")
-         return None, "Error: Incorrect password provided."
     except Exception as e:
         logger.error(f"Error removing password for {filename_for_log}: {e}", exc_info=True)
-        if writer: writer.close()
         return None, f"Error removing password: {e}"
 # --- END UNLOCK PDF ---
 
 
 # --- PDF TO IMAGES ---
-# (Paste the pdf_to_images function from previous answer here, ensure logging)
+MAX_RENDER_PIXELS = 40_000_000 # ~120 MB per RGB bitmap, a bit more than A0 at 150 DPI
+MAX_PENDING_PAGE_WRITES = 2 # Encoded pages allowed to wait for the writer thread
+
+def _capped_dpi(page, dpi):
+    """Lowers the DPI for a single page if rendering it would exceed MAX_RENDER_PIXELS."""
+    pixels = page.rect.width * page.rect.height * (dpi / 72) ** 2
+    if pixels <= MAX_RENDER_PIXELS:
+        return dpi
+    return max(1, int(dpi * math.sqrt(MAX_RENDER_PIXELS / pixels)))
+
+_worker_render_doc = None # Document opened once per render worker process by _open_render_doc
+
+def _open_render_doc(pdf_path):
+    """Pool initializer: opens the PDF once per worker process, for every chunk the worker renders."""
+    global _worker_render_doc
+    _worker_render_doc = fitz.open(pdf_path)
+
+def _render_page_range(pdf_source, first_page, last_page, fmt, dpi, base_name):
+    """Renders pages first_page..last_page (1-based, inclusive) with PyMuPDF and saves them as images.
+       pdf_source is a path string or the PDF bytes, or None inside a pool worker to use the
+       document opened by _open_render_doc (fitz documents can't be shared between processes).
+       Returns the saved image paths in page order.
+    """
+    ext = ".jpg" if fmt == 'jpeg' else ".png"
+    encoder = "jpg" if fmt == 'jpeg' else "png"
+    saved_paths = []
+    fitz.TOOLS.reset_mupdf_warnings()
+    if pdf_source is None:
+        doc = _worker_render_doc
+    elif isinstance(pdf_source, bytes):
+        doc = fitz.open(stream=pdf_source, filetype="pdf")
+    else:
+        doc = fitz.open(pdf_source)
+    try:
+        # Encoding stays on this thread (it needs the Document), a writer thread flushes finished pages
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            writes = collections.deque()
+            for page_num in range(first_page, last_page + 1):
+                page = doc.load_page(page_num - 1)
+                page_dpi = _capped_dpi(page, dpi)
+                if page_dpi != dpi:
+                    logger.warning(f"Page {page_num} is too large to render at {dpi} DPI, using {page_dpi} DPI instead.")
+                pix = page.get_pixmap(dpi=page_dpi, alpha=False) # RGB, no alpha, so JPEG needs no flattening
+                data = pix.tobytes(output=encoder, jpg_quality=90)
+                pix = page = None # Drop the raw bitmap now instead of when the next page replaces it
+                output_path = get_output_filename(base_name, f"page_{page_num}", ext)
+                saved_paths.append(output_path)
+                writes.append(writer.submit(write_output_file, output_path, data))
+                data = None
+                if len(writes) > MAX_PENDING_PAGE_WRITES: # Keep at most a few encoded pages in memory
+                    writes.popleft().result()
+            for write in writes:
+                write.result()
+        mupdf_warnings = fitz.TOOLS.mupdf_warnings()
+        if mupdf_warnings: # Damaged content MuPDF rendered around rather than failing on
+            logger.warning(f"MuPDF reported problems rendering pages {first_page}-{last_page} of '{base_name}': {mupdf_warnings}")
+    except Exception:
+        for p in saved_paths: cleanup_temp_file(p)
+        raise
+    finally:
+        if pdf_source is not None:
+            doc.close()
+    return saved_paths
+
+RENDER_CHUNK_PAGES = 10 # Pages per worker task; small enough to balance load, large enough to amortize each open
+
+def _iter_page_images(pdf_source, total_pages, fmt, dpi, base_name):
+    """Renders all pages in RENDER_CHUNK_PAGES chunks across a process pool and yields the image
+       paths in page order, so earlier pages can be consumed while later chunks still render.
+       If iteration stops early (error or the caller closing the generator), queued chunks are
+       cancelled and images that were never yielded are removed.
+    """
+    shards = [(lo, min(lo + RENDER_CHUNK_PAGES - 1, total_pages)) for lo in range(1, total_pages + 1, RENDER_CHUNK_PAGES)]
+    workers = min(os.cpu_count() or 1, len(shards))
+    logger.info(f"Rendering {total_pages} pages in {len(shards)} chunk(s) using {workers} worker(s).")
+
+    executor = None
+    futures = []
+    scratch_pdf = None
+    if workers > 1:
+        # Workers get a path, not the bytes: each opens the PDF once in the pool initializer
+        # instead of receiving and re-parsing the whole document with every chunk
+        if isinstance(pdf_source, bytes):
+            fd, scratch_pdf = tempfile.mkstemp(prefix="render_", suffix=".pdf", dir=scratch_dir(len(pdf_source)))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf_source)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_open_render_doc, initargs=(scratch_pdf or pdf_source,))
+        futures = [executor.submit(_render_page_range, None, lo, hi, fmt, dpi, base_name) for lo, hi in shards]
+        chunk_results = (future.result() for future in futures) # Submission order keeps pages in order
+    else:
+        chunk_results = (_render_page_range(pdf_source, lo, hi, fmt, dpi, base_name) for lo, hi in shards)
+
+    consumed = 0 # Chunks whose results reached the loop below
+    chunk, handed_out = [], 0
+    try:
+        for chunk in chunk_results:
+            consumed += 1
+            handed_out = 0
+            for path in chunk:
+                handed_out += 1
+                yield path
+        chunk = []
+    finally:
+        for path in chunk[handed_out:]: cleanup_temp_file(path)
+        if executor is not None:
+            for future in futures: future.cancel()
+            executor.shutdown(wait=True)
+            for future in futures[consumed:]:
+                if not future.cancelled() and future.exception() is None:
+                    for path in future.result(): cleanup_temp_file(path)
+        if scratch_pdf:
+            cleanup_temp_file(scratch_pdf)
+
 def pdf_to_images(pdf_file, fmt='jpeg', dpi=200, output_filename_base="page"):
     """Converts each page of a PDF (path or stream) to image files."""
     ensure_output_dir()
@@ -389,114 +676,109 @@ def pdf_to_images(pdf_file, fmt='jpeg', dpi=200, output_filename_base="page"):
     if fmt not in ['jpeg', 'png']:
         return [], "Error: Unsupported image format. Use 'jpeg' or 'png'."
 
-    temp_pdf_path_obj = None # Use Path object for consistency
-    input_path_str = None # Path as string for pdf2image
     filename_for_log = getattr(pdf_file, 'filename', 'N/A')
 
     try:
-        # Handle stream input by saving temporarily
+        # Stream input is rendered straight from memory, no temporary PDF needed
         if isinstance(pdf_file, (io.BytesIO, io.BufferedReader)):
-            temp_pdf_path_obj = OUTPUT_DIR / f"temp_img_conv_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf"
-            logger.info(f"Input is a stream for pdf_to_images, saving temporarily to {temp_pdf_path_obj}")
-            with open(temp_pdf_path_obj, 'wb') as f:
-                pdf_file.seek(0)
-                f.write(pdf_file.read())
-                pdf_file.seek(0)
-            input_path_str = str(temp_pdf_path_obj)
+            pdf_source = _load_bytes(pdf_file)
             filename_for_log = Path(filename_for_log).stem # Use stem from original name if possible
         elif isinstance(pdf_file, (str, Path)):
-             input_path_str = str(pdf_file)
-             filename_for_log = Path(input_path_str).stem
+             pdf_source = str(pdf_file)
+             filename_for_log = Path(pdf_source).stem
         else:
              raise TypeError("Unsupported input type for pdf_file. Must be path string or stream.")
 
-        logger.info(f"Attempting to convert PDF '{Path(input_path_str).name}' to {fmt} images (DPI: {dpi}).")
-        logger.info(f"Using Poppler path: {POPPLER_PATH or 'System PATH'}")
-
-        # Check for encryption *before* passing to pdf2image
+        logger.info(f"Attempting to convert PDF '{filename_for_log}' to {fmt} images (DPI: {dpi}).")
+        # Check for encryption *before* rendering, on the same PyMuPDF parse that gives the page count
         try:
-            reader_check = PdfReader(input_path_str)
-            if reader_check.is_encrypted:
-                if reader_check.decrypt('') == 0:
-                     err_msg = f"Error: Input PDF '{Path(input_path_str).name}' is password protected."
+            with (fitz.open(stream=pdf_source, filetype="pdf") if isinstance(pdf_source, bytes) else fitz.open(pdf_source)) as doc:
+                if doc.needs_pass and not doc.authenticate(''):
+                     err_msg = f"Error: Input PDF '{filename_for_log}' is password protected."
                      logger.error(err_msg)
-                     # Cleanup temp file before returning
-                     if temp_pdf_path_obj and temp_pdf_path_obj.exists(): os.remove(temp_pdf_path_obj)
                      return [], err_msg
+                total_pages = doc.page_count
         except Exception as pdf_err:
-            logger.error(f"Error checking PDF encryption for '{Path(input_path_str).name}': {pdf_err}")
-            if temp_pdf_path_obj and temp_pdf_path_obj.exists(): os.remove(temp_pdf_path_obj)
+            logger.error(f"Error checking PDF encryption for '{filename_for_log}': {pdf_err}")
             return [], f"Error reading input PDF: {pdf_err}"
 
-        # Convert using pdf2image
-        images = convert_from_path(
-            input_path_str,
-            dpi=dpi,
-            fmt=fmt,
-            poppler_path=POPPLER_PATH,
-            thread_count=2
-        )
+        if total_pages < 1:
+            return [], "Error: Input PDF has no pages."
 
-        if not images:
-            logger.error("pdf2image returned no images. Check Poppler installation and PATH.")
-            if temp_pdf_path_obj and temp_pdf_path_obj.exists(): os.remove(temp_pdf_path_obj)
-            return [], "Error converting PDF to images. Check Poppler installation/PATH."
+        try:
+            for path in _iter_page_images(pdf_source, total_pages, fmt, dpi, filename_for_log):
+                output_paths.append(path)
+        except Exception:
+            for p in output_paths: cleanup_temp_file(p)
+            raise
 
-        logger.info(f"Successfully generated {len(images)} image objects from PDF.")
-        ext = ".jpg" if fmt == 'jpeg' else ".png"
-
-        for i, image in enumerate(images):
-            output_path = get_output_filename(filename_for_log, f"page_{i+1}", ext)
-            try:
-                 # Handle potential transparency for PNGs before saving JPEG
-                 if fmt == 'jpeg' and image.mode in ('RGBA', 'LA', 'P'):
-                      logger.debug(f"Converting image {i+1} to RGB before saving as JPEG.")
-                      # Create a white background image
-                      bg = Image.new("RGB", image.size, (255, 255, 255))
-                      # Paste the image onto the background using its alpha channel or P mode palette
-                      bg.paste(image, (0,0), image if image.mode == 'RGBA' or image.mode == 'LA' else None)
-                      image_to_save = bg
-                 else:
-                      image_to_save = image
-
-                 image_to_save.save(output_path, fmt.upper())
-                 output_paths.append(output_path)
-                 # logger.debug(f"Saved image: {output_path}") # Verbose
-            except Exception as save_err:
-                logger.error(f"Failed to save image {i+1} to {output_path}: {save_err}", exc_info=True)
-                # Cleanup created images and temp file
-                for p in output_paths: os.remove(p)
-                if temp_pdf_path_obj and temp_pdf_path_obj.exists(): os.remove(temp_pdf_path_obj)
-                return [], f"Error saving generated image: {save_err}"
+        if not output_paths:
+            logger.error("Rendering produced no images.")
+            return [], "Error converting PDF to images: no pages were rendered."
 
         logger.info(f"Successfully saved {len(output_paths)} images.")
         return output_paths, None
 
     except Exception as e:
         logger.error(f"Error converting PDF '{filename_for_log}' to images: {e}", exc_info=True)
-        if "pdfinfo" in str(e) or "pdftoppm" in str(e) or "Poppler" in str(e):
-             err_msg = f"Error during conversion, likely Poppler related. Is Poppler installed and in PATH? Details: {e}"
-        else:
-             err_msg = f"Unexpected error converting PDF to images: {e}"
-        # Cleanup temp file if it exists
-        if temp_pdf_path_obj and temp_pdf_path_obj.exists(): os.remove(temp_pdf_path_obj)
-        return [], err_msg
-    finally:
-        # Final cleanup check for temp file
-        if temp_pdf_path_obj and temp_pdf_path_obj.exists():
-            try:
-                os.remove(temp_pdf_path_obj)
-                logger.info(f"Removed temporary file: {temp_pdf_path_obj}")
-            except OSError as e_rem:
-                logger.warning(f"Could not remove temporary file {temp_pdf_path_obj}: {e_rem}")
+        return [], f"Unexpected error converting PDF to images: {e}"
 # --- END PDF TO IMAGES ---
 
 
 # --- IMAGE TO PDF ---
 # (Paste a working images_to_pdf function definition here, ensure logging)
+def _flatten_onto_white(img):
+    """Composites an image with transparency onto a white RGB background.
+       The RGBA image is its own paste mask, so Pillow reads alpha in place instead of
+       splitting the image into separate band copies first.
+    """
+    rgba = img if img.mode == 'RGBA' else img.convert('RGBA')
+    bg = Image.new("RGB", img.size, (255, 255, 255))
+    bg.paste(rgba, mask=rgba)
+    return bg
+
+def _images_to_pdf_img2pdf(image_files, output_filename_base):
+    """Builds the PDF with img2pdf: JPEGs are embedded as-is (DCTDecode) and other formats losslessly,
+       so nothing is re-encoded. Only images with transparency are decoded, to flatten them onto white.
+       Raises if img2pdf rejects an input, so the caller can fall back to Pillow.
+    """
+    pages = []
+    processed_files_info = [] # Store filenames for logging
+    for img_stream in image_files:
+        filename = getattr(img_stream, 'filename', 'N/A')
+        try:
+            data = _load_bytes(img_stream)
+            with Image.open(io.BytesIO(data)) as img: # Reads the header only
+                if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+                    logger.debug(f"Flattening transparent image '{filename}' ({img.mode}) onto white.")
+                    flat = io.BytesIO()
+                    _flatten_onto_white(img).save(flat, "PNG")
+                    data = flat.getvalue()
+        except Exception as e:
+            logger.warning(f"Skipping file {filename} due to error opening or converting image: {e}")
+            continue # Skip this image
+        pages.append(data)
+        processed_files_info.append(filename)
+
+    if not pages:
+        return None, "Error: No valid images found or processed."
+
+    output_path = get_output_filename(output_filename_base, "converted", ".pdf")
+    logger.info(f"Converting {len(pages)} images ({', '.join(processed_files_info)}) to PDF with img2pdf: {output_path}")
+    # Fixed 100 DPI keeps page sizes identical to the Pillow path
+    pdf_bytes = img2pdf.convert(pages, layout_fun=img2pdf.get_fixed_dpi_layout_fun((100, 100)))
+    write_output_file(output_path, pdf_bytes)
+    return output_path, None
+
 def images_to_pdf(image_files, output_filename_base="from_images"):
     """Converts multiple image file streams into a single PDF."""
     ensure_output_dir()
+    if IMG2PDF_AVAILABLE:
+        try:
+            return _images_to_pdf_img2pdf(image_files, output_filename_base)
+        except Exception as e:
+            logger.warning(f"img2pdf could not convert the images ({e}). Falling back to Pillow.")
+
     pil_images = []
     processed_files_info = [] # Store filenames for logging
 
@@ -511,10 +793,7 @@ def images_to_pdf(image_files, output_filename_base="from_images"):
                     logger.debug(f"Converting image '{filename}' from {img.mode} to RGB.")
                     # Create a white background and paste image with alpha mask if applicable
                     if img.mode == 'RGBA' or img.mode == 'LA':
-                         alpha = img.split()[-1]
-                         bg = Image.new("RGB", img.size, (255, 255, 255))
-                         bg.paste(img, mask=alpha)
-                         img_converted = bg
+                         img_converted = _flatten_onto_white(img)
                     else: # Palette mode, P
                          img_converted = img.convert('RGB')
                     pil_images.append(img_converted)
@@ -561,78 +840,260 @@ def images_to_pdf(image_files, output_filename_base="from_images"):
 
 
 # --- OFFICE TO PDF ---
-# (Paste the office_to_pdf function from previous answer here, ensure logging/path handling)
-def office_to_pdf(office_file_path, output_filename_base="converted"):
-    """Converts an Office document (Word, Excel, PPT) to PDF using LibreOffice."""
+@functools.lru_cache(maxsize=1)
+def _find_soffice(env_hint=None):
+    """Locates the LibreOffice executable once per process. Returns its path, or None if not found.
+       env_hint is the current SOFFICE_PATH value; it is part of the cache key, so changing the
+       variable triggers a fresh lookup.
+    """
+    soffice_command = env_hint # Prioritize environment variable
+    if soffice_command and Path(soffice_command).is_file(): # Check if it's a file
+         logger.info(f"Using soffice path from SOFFICE_PATH env var: {soffice_command}")
+         return soffice_command
+    # Plain PATH lookup first, no need to spawn anything
+    soffice_command = shutil.which('soffice') or shutil.which('libreoffice')
+    if soffice_command:
+        logger.info(f"Found LibreOffice command on PATH: {soffice_command}")
+        return soffice_command
+    # Search in common install locations within the container/system
+    possible_paths = [
+        "/usr/bin/soffice",
+        "/usr/bin/libreoffice",
+        "/usr/lib/libreoffice/program/soffice",
+        "/opt/libreoffice/program/soffice",
+        "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+    ]
+    for cmd_path in possible_paths:
+        if os.path.isfile(cmd_path) and os.access(cmd_path, os.X_OK):
+            logger.info(f"Found LibreOffice command: {cmd_path}")
+            return cmd_path
+    return None
+
+# --- Persistent LibreOffice listener (used when python-uno is available) ---
+# Point these at an already running `soffice --accept=...` server (e.g. a sidecar sharing the
+# upload/output volumes) to reuse it; otherwise a local listener is started on first use.
+SOFFICE_UNO_HOST = os.environ.get('SOFFICE_UNO_HOST', 'localhost')
+SOFFICE_UNO_PORT = int(os.environ.get('SOFFICE_UNO_PORT', '2002'))
+SOFFICE_UNO_CONNECT = f"socket,host={SOFFICE_UNO_HOST},port={SOFFICE_UNO_PORT};urp;"
+_soffice_listener = None # Popen handle of the listener we started, if any
+_soffice_listener_profile = None
+_soffice_listener_lock = threading.Lock()
+_soffice_desktop = None # Desktop proxy reused across conversions, the UNO bridge is only set up once
+_soffice_listener_failed = False # Set once the listener can't be used; later conversions go straight to soffice
+SOFFICE_LISTENER_START_TIMEOUT = 60 # Seconds to wait for a freshly started listener to accept connections
+UNO_CONVERT_TIMEOUT = 300 # Seconds per document through the listener, same budget as a one-off soffice run
+
+def _resolve_uno_desktop(timeout=0, process=None):
+    """Connects to the LibreOffice listener and returns its Desktop, retrying for up to `timeout` seconds.
+       Gives up early if `process` (the listener being started) exits in the meantime.
+    """
+    local_ctx = uno.getComponentContext()
+    resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ctx = resolver.resolve(f"uno:{SOFFICE_UNO_CONNECT}StarOffice.ComponentContext")
+            return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        except NoConnectException:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"LibreOffice listener exited during startup (code {process.returncode})")
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.25) # Listener still starting up
+
+def _ensure_soffice_listener(soffice_command):
+    """Returns a Desktop on the persistent headless LibreOffice, starting the listener on first use."""
+    global _soffice_listener, _soffice_listener_profile, _soffice_desktop, _soffice_listener_failed
+    with _soffice_listener_lock:
+        if _soffice_desktop is not None:
+            return _soffice_desktop
+        if _soffice_listener_failed:
+            raise RuntimeError("LibreOffice listener is unavailable.")
+        try:
+            _soffice_desktop = _resolve_uno_desktop() # Already running (ours or another worker's)
+            return _soffice_desktop
+        except NoConnectException:
+            if SOFFICE_UNO_HOST not in ('localhost', '127.0.0.1', '::1'):
+                raise # External server configured but unreachable, can't start one over there
+        if _soffice_listener is None or _soffice_listener.poll() is not None:
+            if _soffice_listener_profile:
+                shutil.rmtree(_soffice_listener_profile, ignore_errors=True) # Profile of a listener that died
+            _soffice_listener_profile = tempfile.mkdtemp(prefix="lo_listener_")
+            cmd = [
+                soffice_command,
+                '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+                f'-env:UserInstallation={Path(_soffice_listener_profile).as_uri()}',
+                f'--accept={SOFFICE_UNO_CONNECT}StarOffice.ComponentContext'
+            ]
+            logger.info(f"Starting persistent LibreOffice listener: {' '.join(cmd)}")
+            _soffice_listener = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _soffice_desktop = _resolve_uno_desktop(SOFFICE_LISTENER_START_TIMEOUT, _soffice_listener)
+        except Exception:
+            _soffice_listener_failed = True # Don't make every later conversion wait for a listener that won't come up
+            _stop_soffice_listener()
+            raise
+        return _soffice_desktop
+
+@atexit.register
+def _stop_soffice_listener():
+    """Terminates the LibreOffice listener started by this process."""
+    if _soffice_listener is not None and _soffice_listener.poll() is None:
+        _soffice_listener.terminate()
+        try:
+            _soffice_listener.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _soffice_listener.kill()
+    if _soffice_listener_profile:
+        shutil.rmtree(_soffice_listener_profile, ignore_errors=True)
+
+def _pdf_export_filter(component):
+    """Picks the PDF export filter matching the loaded document type."""
+    if component.supportsService("com.sun.star.sheet.SpreadsheetDocument"):
+        return "calc_pdf_Export"
+    if component.supportsService("com.sun.star.presentation.PresentationDocument"):
+        return "impress_pdf_Export"
+    if component.supportsService("com.sun.star.drawing.DrawingDocument"):
+        return "draw_pdf_Export"
+    return "writer_pdf_Export"
+
+def _convert_with_uno(soffice_command, input_file_path, output_pdf_path, cancelled=None):
+    """Converts a document to PDF in-process, through the persistent LibreOffice listener."""
+    global _soffice_desktop
+    load_props = (PropertyValue("Hidden", 0, True, 0),)
+    try:
+        component = _ensure_soffice_listener(soffice_command).loadComponentFromURL(input_file_path.as_uri(), "_blank", 0, load_props)
+    except DisposedException:
+        if cancelled is not None and cancelled.is_set():
+            raise # Listener was killed because this conversion timed out, don't start over
+        # Cached bridge died (listener restarted or crashed), reconnect once
+        _soffice_desktop = None
+        component = _ensure_soffice_listener(soffice_command).loadComponentFromURL(input_file_path.as_uri(), "_blank", 0, load_props)
+    if component is None:
+        raise RuntimeError(f"LibreOffice could not open '{input_file_path.name}'.")
+    try:
+        filter_name = _pdf_export_filter(component)
+        component.storeToURL(Path(output_pdf_path).resolve().as_uri(), (PropertyValue("FilterName", 0, filter_name, 0),))
+    finally:
+        component.close(True)
+
+def _convert_with_uno_timeout(soffice_command, input_file_path, output_pdf_path):
+    """Runs _convert_with_uno, giving up after UNO_CONVERT_TIMEOUT. UNO calls can't be cancelled, so a
+       listener we started is killed (unblocking the call, restarted on next use); an external one is no longer used.
+    """
+    global _soffice_desktop, _soffice_listener_failed
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(_convert_with_uno, soffice_command, input_file_path, output_pdf_path, cancelled)
+    executor.shutdown(wait=False)
+    try:
+        future.result(timeout=UNO_CONVERT_TIMEOUT)
+    except FutureTimeoutError:
+        cancelled.set()
+        with _soffice_listener_lock:
+            _soffice_desktop = None
+            if _soffice_listener is not None and _soffice_listener.poll() is None:
+                _stop_soffice_listener()
+            else:
+                _soffice_listener_failed = True
+        cleanup_temp_file(output_pdf_path)
+        future.add_done_callback(lambda _: cleanup_temp_file(output_pdf_path)) # In case the call still completes
+        raise RuntimeError(f"LibreOffice listener conversion timed out (> {UNO_CONVERT_TIMEOUT}s)")
+
+def batch_office_to_pdf(office_file_paths, output_filename_base=None):
+    """Converts several Office documents (Word, Excel, PPT) to PDF using LibreOffice, paying its startup once.
+       Uses the persistent UNO listener when available; anything left is converted by a single soffice process.
+       Returns the output PDF paths in input order, or None and an error message.
+    """
     ensure_output_dir()
     output_dir_abs = OUTPUT_DIR.resolve() # LibreOffice needs an absolute path
-    input_file_path = Path(office_file_path).resolve() # Ensure input is absolute path too
-    input_filename = input_file_path.name
+    input_paths = [Path(p).resolve() for p in office_file_paths] # Ensure inputs are absolute paths too
+    if not input_paths:
+        return [], None
 
-    logger.info(f"Attempting to convert Office file '{input_filename}' to PDF using LibreOffice.")
+    logger.info(f"Attempting to convert {len(input_paths)} Office file(s) to PDF using LibreOffice.")
 
     # --- Find soffice ---
-    soffice_command = os.environ.get('SOFFICE_PATH') # Prioritize environment variable
-    if soffice_command and Path(soffice_command).is_file(): # Check if it's a file
-         logger.info(f"Using soffice path from SOFFICE_PATH env var: {soffice_command}")
-    else:
-        # Search in common locations within the container/system
-        possible_paths = ["soffice", "libreoffice", "/usr/bin/soffice", "/usr/bin/libreoffice"]
-        found = False
-        for cmd_path in possible_paths:
-            try:
-                logger.debug(f"Checking for soffice at: {cmd_path}")
-                result = subprocess.run([cmd_path, '--version'], check=True, capture_output=True, text=True, timeout=10)
-                logger.info(f"Found working LibreOffice command: {cmd_path}. Version: {result.stdout.strip()}")
-                soffice_command = cmd_path
-                found = True
-                break
-            except (subprocess.CalledProcessError, FileNotFoundError, PermissionError, subprocess.TimeoutExpired) as check_err:
-                logger.debug(f"Checking '{cmd_path}' failed: {check_err}")
-                continue
-        if not found:
-             msg = "Error: LibreOffice 'soffice' command not found or not executable in expected paths. Install LibreOffice or set SOFFICE_PATH."
-             logger.error(msg)
-             return None, msg
+    soffice_hint = os.environ.get('SOFFICE_PATH')
+    soffice_command = _find_soffice(soffice_hint)
+    if soffice_command and not os.access(soffice_command, os.X_OK): # Cached path went away, look again
+        _find_soffice.cache_clear()
+        soffice_command = _find_soffice(soffice_hint)
+    if not soffice_command:
+         _find_soffice.cache_clear() # Don't remember the miss, LibreOffice may be installed later
+         msg = "Error: LibreOffice 'soffice' command not found or not executable in expected paths. Install LibreOffice or set SOFFICE_PATH."
+         logger.error(msg)
+         return None, msg
     # --- End Find soffice ---
 
+    output_paths = [None] * len(input_paths)
+    if UNO_AVAILABLE:
+        for i, input_file_path in enumerate(input_paths):
+            if _soffice_listener_failed:
+                break # Rest goes to the one-off process
+            final_output_path = get_output_filename(output_filename_base or input_file_path.stem, "from_office", ".pdf")
+            try:
+                _convert_with_uno_timeout(soffice_command, input_file_path, final_output_path)
+                if final_output_path.exists():
+                    logger.info(f"LibreOffice listener created: {final_output_path}")
+                    output_paths[i] = final_output_path
+                    continue
+                logger.warning(f"LibreOffice listener produced no output for '{input_file_path.name}'. Falling back to a one-off process.")
+            except Exception as uno_err:
+                logger.warning(f"UNO conversion failed for '{input_file_path.name}': {uno_err}. Falling back to a one-off process.")
+
+    pending = [i for i, path in enumerate(output_paths) if path is None]
+    if not pending:
+        return output_paths, None
+
+    # Private profile and output folder per run, so concurrent conversions don't fight over
+    # the same user installation or over same-named outputs
+    profile_dir = tempfile.mkdtemp(prefix="lo_profile_")
+    batch_dir = Path(tempfile.mkdtemp(prefix="lo_out_", dir=output_dir_abs))
+    timeout = 300 + 60 * (len(pending) - 1) # 5 min for the first file, 1 min for each extra one
     try:
-        cmd = [
-            soffice_command,
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', str(output_dir_abs),
-            str(input_file_path)
-        ]
-        logger.info(f"Running LibreOffice command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=300) # 5 min timeout
-        logger.info(f"LibreOffice stdout: {result.stdout or '[No stdout]'}")
-        if result.stderr:
-            logger.warning(f"LibreOffice stderr: {result.stderr}")
-
-        # --- Verify output ---
-        original_stem = input_file_path.stem
-        expected_pdf = output_dir_abs / f"{original_stem}.pdf"
-
-        if expected_pdf.exists():
-             logger.info(f"LibreOffice successfully created: {expected_pdf}")
-             final_output_path = get_output_filename(output_filename_base or original_stem, "from_office", ".pdf")
-             try:
-                 expected_pdf.rename(final_output_path)
-                 logger.info(f"Renamed output file to: {final_output_path}")
-                 return final_output_path, None
-             except OSError as rename_err:
-                 logger.error(f"Failed to rename '{expected_pdf}' to '{final_output_path}': {rename_err}")
-                 return expected_pdf, None # Return original path if rename fails
+        while pending:
+            # soffice names outputs by stem, so inputs sharing a stem go into separate runs
+            batch, seen_stems = [], set()
+            for i in pending:
+                if input_paths[i].stem not in seen_stems:
+                    seen_stems.add(input_paths[i].stem)
+                    batch.append(i)
+            pending = [i for i in pending if i not in batch]
+
+            cmd = [
+                soffice_command,
+                '--headless',
+                f'-env:UserInstallation={Path(profile_dir).as_uri()}',
+                '--convert-to', 'pdf',
+                '--outdir', str(batch_dir),
+                *[str(input_paths[i]) for i in batch]
+            ]
+            logger.info(f"Running LibreOffice command: {' '.join(cmd)}")
+            result = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=timeout)
+            logger.info(f"LibreOffice stdout: {result.stdout or '[No stdout]'}")
+            if result.stderr:
+                logger.warning(f"LibreOffice stderr: {result.stderr}")
+
+            # --- Verify output ---
+            for i in batch:
+                original_stem = input_paths[i].stem
+                expected_pdf = batch_dir / f"{original_stem}.pdf"
+                if not expected_pdf.exists():
+                    err_msg = f"Error: Expected PDF '{expected_pdf.name}' not found after LibreOffice command."
+                    logger.error(err_msg)
+                    for path in output_paths: cleanup_temp_file(path)
+                    if result.stderr and "Error:" in result.stderr:
+                         return None, err_msg + f" Details: {result.stderr[:500]}"
+                    return None, err_msg + " Check LibreOffice compatibility or installation."
 
-        else:
-            err_msg = f"Error: Expected PDF '{expected_pdf}' not found after LibreOffice command."
-            logger.error(err_msg)
-            if result.stderr and "Error:" in result.stderr:
-                 err_detail = f" Details: {result.stderr[:500]}"
-                 return None, err_msg + err_detail
-            else:
-                 return None, err_msg + " Check LibreOffice compatibility or installation."
+                logger.info(f"LibreOffice successfully created: {expected_pdf}")
+                final_output_path = get_output_filename(output_filename_base or original_stem, "from_office", ".pdf")
+                expected_pdf.rename(final_output_path)
+                logger.info(f"Renamed output file to: {final_output_path}")
+                output_paths[i] = final_output_path
+
+        return output_paths, None
 
     except FileNotFoundError:
          msg = f"Error: LibreOffice command '{soffice_command}' not found during execution."
@@ -640,24 +1101,126 @@ def office_to_pdf(office_file_path, output_filename_base="converted"):
          return None, msg
     except subprocess.CalledProcessError as e:
         logger.error(f"LibreOffice conversion failed (exit code {e.returncode}). Stderr: {e.stderr}", exc_info=True)
+        for path in output_paths: cleanup_temp_file(path)
         err_msg = f"Error during LibreOffice conversion (Code {e.returncode})."
         if e.stderr: err_msg += f" Details: {e.stderr[:500]}"
         return None, err_msg
     except subprocess.TimeoutExpired:
         logger.error("Error: LibreOffice conversion timed out.")
-        return None, "Error: Office to PDF conversion timed out (> 5 minutes)."
+        for path in output_paths: cleanup_temp_file(path)
+        return None, f"Error: Office to PDF conversion timed out (> {timeout // 60} minutes)."
     except Exception as e:
         logger.error(f"Unexpected error during Office to PDF conversion: {e}", exc_info=True)
+        for path in output_paths: cleanup_temp_file(path)
         return None, f"Unexpected error during Office to PDF conversion: {e}"
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+def office_to_pdf(office_file_path, output_filename_base="converted"):
+    """Converts an Office document (Word, Excel, PPT) to PDF using LibreOffice."""
+    output_paths, error_msg = batch_office_to_pdf([office_file_path], output_filename_base)
+    if error_msg:
+        return None, error_msg
+    return output_paths[0], None
 # --- END OFFICE TO PDF ---
 
 
+COMPRESS_SAVE_OPTIONS = {
+    'garbage': 4, 'deflate': True, 'clean': True,
+    'deflate_images': True, 'deflate_fonts': True,
+    'use_objstms': 1, 'compression_effort': 100,
+}
+NEWER_SAVE_OPTIONS = ('use_objstms', 'compression_effort') # Not accepted by every supported PyMuPDF
+# garbage level by input size: full object dedup (4) only pays off on larger files
+COMPRESS_GARBAGE_TIERS = ((1 * 1024 * 1024, 1), (16 * 1024 * 1024, 3))
+COMPRESS_SAVE_TIMEOUT = 90 # Seconds; below gunicorn's --timeout 120, past it the save process is killed and the original returned
+COMPRESS_CACHE_DIR = OUTPUT_DIR / ".cache" # Compressed results keyed by input content + save options
+COMPRESS_CACHE_MAX_ENTRIES = 256
+
+def _link_or_copy(src, dst):
+    """Hard-links src to dst (no data copied), copying instead where links aren't possible.
+       Raises FileExistsError if dst exists. A copy goes to a temp name next to dst and is renamed
+       into place, so a file someone else may be reading is never rewritten in place.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        fd, tmp_path = tempfile.mkstemp(dir=Path(dst).parent, prefix=".partial_")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            cleanup_temp_file(tmp_path)
+            raise
+
+def _compress_cache_path(source, save_params):
+    """Cache file for compressing source (a path or the PDF bytes) with save_params."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest = hashlib.sha256(source)
+    else:
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    digest.update(repr(sorted(save_params.items())).encode())
+    return COMPRESS_CACHE_DIR / f"{digest.hexdigest()}.pdf"
+
+def _store_compressed(cache_path, output_path):
+    """Adds a fresh compression result to the cache, evicting the oldest entries past the limit."""
+    try:
+        COMPRESS_CACHE_DIR.mkdir(exist_ok=True)
+        try:
+            _link_or_copy(output_path, cache_path)
+        except FileExistsError:
+            return # A concurrent request compressed the same input and already cached it
+        entries = list(COMPRESS_CACHE_DIR.iterdir())
+        if len(entries) > COMPRESS_CACHE_MAX_ENTRIES:
+            entries.sort(key=lambda p: p.stat().st_mtime)
+            for old in entries[:len(entries) - COMPRESS_CACHE_MAX_ENTRIES]:
+                old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not cache compressed PDF {output_path}: {e}") # Only costs a future cache hit
+
+def _garbage_level(size):
+    """Returns the save garbage level for an input of size bytes (see COMPRESS_GARBAGE_TIERS)."""
+    for limit, level in COMPRESS_GARBAGE_TIERS:
+        if size < limit:
+            return level
+    return COMPRESS_SAVE_OPTIONS['garbage']
+
+def _save_compressed(doc, path, save_params, explicit_params):
+    """Saves doc with save_params, retrying without the newer options older PyMuPDF versions reject."""
+    try:
+        doc.save(path, **save_params)
+    except TypeError:
+        # Older PyMuPDF without object streams / compression effort: retry without our defaults for them
+        for key in NEWER_SAVE_OPTIONS:
+            if key not in explicit_params: save_params.pop(key, None)
+        doc.save(path, **save_params)
+
+def _compress_in_child(conn, source, path, save_params, explicit_params):
+    """Child process entry point: opens source (a path or the PDF bytes), saves it compressed to path
+       and sends back None, or the error message if the save failed.
+    """
+    try:
+        doc = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+        with doc:
+            _save_compressed(doc, path, save_params, explicit_params)
+        conn.send(None)
+    except Exception as e:
+        conn.send(str(e))
+    finally:
+        conn.close()
+
 def compress_pdf(pdf_path_or_stream, output_filename_base="compressed", **kwargs): # Add **kwargs
     """Compresses a PDF file using PyMuPDF optimizations."""
     ensure_output_dir()
     doc = None
     filename_for_log = "input_stream"
-    temp_pdf_path_obj = None
     original_size = 0
     compressed_size = 0
 
@@ -667,44 +1230,73 @@ def compress_pdf(pdf_path_or_stream, output_filename_base="compressed", **kwargs
             pdf_path = str(pdf_path_or_stream)
             filename_for_log = Path(pdf_path).name
             original_size = Path(pdf_path).stat().st_size
-            doc = fitz.open(pdf_path)
+            source = pdf_path
+            open_doc = functools.partial(fitz.open, pdf_path)
         elif isinstance(pdf_path_or_stream, (io.BytesIO, io.BufferedReader)):
             filename_for_log = getattr(pdf_path_or_stream, 'filename', 'input_stream')
             
-            # Read stream to get its size
-            pdf_path_or_stream.seek(0)
-            stream_content = pdf_path_or_stream.read()
-            original_size = len(stream_content)
-            pdf_path_or_stream.seek(0) # Reset stream
-
-            # Save stream temporarily as fitz.open might need path for some operations or complex PDFs
-            temp_dir = OUTPUT_DIR 
-            temp_pdf_path_obj = temp_dir / f"temp_compress_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf"
-            logger.info(f"Input is a stream for compression, saving temporarily to {temp_pdf_path_obj}")
-            with open(temp_pdf_path_obj, 'wb') as f:
-                f.write(stream_content) # Write the read content
-            doc = fitz.open(str(temp_pdf_path_obj))
+            # Opened straight from memory, no temporary file
+            source = pdf_bytes = _load_bytes(pdf_path_or_stream)
+            original_size = len(pdf_bytes)
+            open_doc = functools.partial(fitz.open, stream=pdf_bytes, filetype="pdf")
             filename_for_log = Path(filename_for_log).stem 
         else:
             raise TypeError("Unsupported input type for compress_pdf. Must be path string or stream.")
 
+        # PyMuPDF save options for compression, augmented/overridden by kwargs
+        save_params = dict(COMPRESS_SAVE_OPTIONS, garbage=_garbage_level(original_size))
+        save_params.update(kwargs) # Apply any new options passed
+        cache_path = _compress_cache_path(source, save_params)
+
+        if cache_path.is_file(): # Same content compressed with the same options before
+            output_path = get_output_filename(output_filename_base or Path(filename_for_log).stem, "compressed", ".pdf")
+            _link_or_copy(cache_path, output_path)
+            compressed_size = output_path.stat().st_size
+            logger.info(f"Compression cache hit for '{filename_for_log}': {output_path} ({compressed_size}B).")
+            return output_path, None, original_size, compressed_size
+
+        doc = open_doc()
+
         if doc.is_encrypted:
             logger.error(f"Cannot compress password-protected PDF: {filename_for_log}")
             if doc: doc.close()
-            if temp_pdf_path_obj: cleanup_temp_file(temp_pdf_path_obj)
             # Return None for sizes as well
             return None, f"Error: Input PDF '{filename_for_log}' is password protected.", None, None 
+        doc.close()
+        doc = None
 
         logger.info(f"Compressing PDF '{filename_for_log}' using PyMuPDF...")
         output_path = get_output_filename(output_filename_base or Path(filename_for_log).stem, "compressed", ".pdf")
 
-        # PyMuPDF save options for compression:
-        # Default options from previous state, will be augmented by kwargs
-        save_params = {'garbage': 4, 'deflate': True}
-        save_params.update(kwargs) # Apply any new options passed
-
-        doc.save(str(output_path), **save_params) # Use the merged parameters
-        doc.close() 
+        # Saved in a child process: MuPDF's save holds the GIL, so only killing the process can stop
+        # a runaway save at COMPRESS_SAVE_TIMEOUT. Its memory goes back to the OS when it exits.
+        partial_path = output_path.with_name(f".partial_{output_path.name}")
+        result_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        saver = multiprocessing.Process(target=_compress_in_child, args=(child_conn, source, str(partial_path), save_params, kwargs), daemon=True)
+        try:
+            saver.start()
+            child_conn.close()
+            saver.join(COMPRESS_SAVE_TIMEOUT)
+            if saver.is_alive():
+                saver.terminate()
+                saver.join()
+                cleanup_temp_file(partial_path)
+                logger.warning(f"Compressing '{filename_for_log}' exceeded {COMPRESS_SAVE_TIMEOUT}s, returning the original file.")
+                if isinstance(source, str):
+                    _link_or_copy(source, output_path)
+                else:
+                    write_output_file(output_path, source)
+                return output_path, None, original_size, original_size
+            save_error = result_conn.recv() if result_conn.poll() else f"save process exited with code {saver.exitcode}"
+            if save_error:
+                raise RuntimeError(save_error)
+        except BaseException:
+            cleanup_temp_file(partial_path)
+            raise
+        finally:
+            result_conn.close()
+        os.replace(partial_path, output_path)
+        _store_compressed(cache_path, output_path)
 
         compressed_size = output_path.stat().st_size
         reduction_percent = 0
@@ -723,12 +1315,32 @@ def compress_pdf(pdf_path_or_stream, output_filename_base="compressed", **kwargs
         logger.error(f"Error compressing PDF '{filename_for_log}': {e}", exc_info=True)
         if doc: doc.close()
         return None, f"Error compressing PDF: {e}", original_size, 0 # Return original_size and 0 for compressed
-    finally:
-        if temp_pdf_path_obj:
-            cleanup_temp_file(temp_pdf_path_obj)
+
+def compress_pdfs_batch(pdf_paths, max_workers=None, **kwargs):
+    """Compresses several PDF files in parallel worker processes (MuPDF's save is CPU-bound).
+       Each output is named after its input file. kwargs are passed on to compress_pdf.
+       Returns one (output_path, error_msg, original_size, compressed_size) tuple per input, in order.
+    """
+    pdf_paths = [str(p) for p in pdf_paths]
+    worker = functools.partial(compress_pdf, output_filename_base=None, **kwargs)
+    workers = min(max_workers or os.cpu_count() or 1, len(pdf_paths))
+    if workers <= 1:
+        return [worker(p) for p in pdf_paths]
+    logger.info(f"Compressing {len(pdf_paths)} PDFs in {workers} worker processes.")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(worker, pdf_paths)) # Each process opens its own documents
 # --- END COMPRESS PDF ---
 
 
+STORE_SHRINK_PAGES = 10 # Pages between MuPDF store evictions in pdf_to_word
+WORD_IMAGE_CACHE_SIZE = 8 # Extracted images kept for reuse on later pages in pdf_to_word
+DOC_RECYCLE_PAGES = 50 # Pages after which pdf_to_word reopens the PDF to release per-page caches
+
+def _extract_image(doc, xref):
+    """Returns (image_bytes, ext) for an image xref; the rest of extract_image's dict is dropped here."""
+    base_image = doc.extract_image(xref)
+    return base_image["image"], base_image["ext"]
+
 def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
     """
     Converts PDF to a Word (.docx) file, extracting text and basic image layout.
@@ -742,7 +1354,6 @@ def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
     doc = None
     word_doc = Document()
     filename_for_log = "input_stream"
-    temp_pdf_path_obj = None
     processed_pages = 0
 
     # Add basic style (optional)
@@ -756,59 +1367,65 @@ def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
         if isinstance(pdf_path_or_stream, (str, Path)):
             pdf_path = str(pdf_path_or_stream)
             filename_for_log = Path(pdf_path).name
-            doc = fitz.open(pdf_path)
+            open_doc = functools.partial(fitz.open, pdf_path)
         elif isinstance(pdf_path_or_stream, (io.BytesIO, io.BufferedReader)):
             filename_for_log = getattr(pdf_path_or_stream, 'filename', 'input_stream')
-            temp_dir = OUTPUT_DIR # Save temp in output temporarily
-            temp_pdf_path_obj = temp_dir / f"temp_toword_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf"
-            logger.info(f"Input stream for PDF-to-Word, saving temp: {temp_pdf_path_obj}")
-            with open(temp_pdf_path_obj, 'wb') as f:
-                pdf_path_or_stream.seek(0)
-                f.write(pdf_path_or_stream.read())
-                pdf_path_or_stream.seek(0)
-            doc = fitz.open(str(temp_pdf_path_obj))
+            open_doc = functools.partial(fitz.open, stream=_load_bytes(pdf_path_or_stream), filetype="pdf") # No temporary file
             filename_for_log = Path(filename_for_log).stem
         else:
             raise TypeError("Unsupported input type for pdf_to_word. Must be path string or stream.")
 
+        doc = open_doc()
         if doc.is_encrypted:
             logger.error(f"Cannot convert password-protected PDF to Word: {filename_for_log}")
             if doc: doc.close()
-            if temp_pdf_path_obj: cleanup_temp_file(temp_pdf_path_obj)
             return None, f"Error: Input PDF '{filename_for_log}' is password protected."
 
         logger.info(f"Starting basic PDF-to-Word conversion for '{filename_for_log}'...")
 
         # --- Process Pages ---
-        for page_num in range(doc.page_count):
+        page_count = doc.page_count
+        image_cache = collections.OrderedDict() # xref -> (bytes, ext) of recently extracted images, LRU
+        for page_num in range(page_count):
+            if page_num and page_num % DOC_RECYCLE_PAGES == 0:
+                # Reopening drops the page tree and object caches the document built up so far
+                doc.close()
+                fitz.TOOLS.store_shrink(100)
+                doc = open_doc()
             page = doc.load_page(page_num)
             logger.debug(f"Processing page {page_num + 1} for text and images...")
 
-            # Extract text blocks with coordinate information
-            blocks = page.get_text("dict")["blocks"]
+            # Text blocks as (x0, y0, x1, y1, text, block_no, block_type) tuples, already in reading order
+            blocks = page.get_text("blocks", sort=True)
             img_list = page.get_images(full=True)
+            # All image placements from one content-stream scan; the first placement of each xref wins
+            img_bboxes = {}
+            if img_list:
+                for info in page.get_image_info(xrefs=True):
+                    img_bboxes.setdefault(info['xref'], info['bbox'])
 
             # Rough logic: try to place images near where they appear relative to text
             # This is VERY basic and won't handle complex layouts well.
-            items = []
-            for b in blocks:
-                if b['type'] == 0: # Text block
-                    for l in b["lines"]:
-                        for s in l["spans"]:
-                             items.append({'type': 'text', 'bbox': s['bbox'], 'text': s['text']})
+            items = [{'type': 'text', 'bbox': blk[:4], 'text': blk[4].rstrip('\n')} for blk in blocks if blk[6] == 0]
 
             for img_index, img_info in enumerate(img_list):
                 xref = img_info[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                img_ext = base_image["ext"]
+                extracted = image_cache.get(xref)
+                if extracted is None:
+                    # extract_image decodes and re-encodes non-JPEG images, so repeats (logos, headers) reuse it
+                    extracted = image_cache[xref] = _extract_image(doc, xref)
+                    if len(image_cache) > WORD_IMAGE_CACHE_SIZE:
+                        image_cache.popitem(last=False)
+                else:
+                    image_cache.move_to_end(xref)
+                image_bytes, img_ext = extracted
                 # Get image position (optional, might be complex to use accurately)
-                # Use page.get_image_bbox(img_info) for coordinates
-                img_bbox = page.get_image_bbox(img_info, transform=True) # Get bbox on page
+                img_bbox = img_bboxes.get(xref) or page.get_image_bbox(img_info) # Rect on the page
                 items.append({'type': 'image', 'bbox': img_bbox, 'bytes': image_bytes, 'ext': img_ext})
 
-            # Sort items approximately by vertical position (top coordinate)
-            items.sort(key=lambda item: item['bbox'][1])
+            if img_list:
+                # Slot the images in by vertical position (top coordinate); text is already ordered
+                items.sort(key=lambda item: item['bbox'][1])
 
             # Add items to Word doc
             for item in items:
@@ -834,11 +1451,16 @@ def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
                         logger.warning(f"Could not add image from page {page_num + 1} to Word doc: {img_err}")
                         word_doc.add_paragraph(f"[Image Processing Error: {img_err}]")
 
+            items.clear() # Image bytes are in the Word doc now, release them before the next page
+
             # Add a page break (except after the last page)
-            if page_num < doc.page_count - 1:
+            if page_num < page_count - 1:
                 word_doc.add_page_break()
 
             processed_pages += 1
+            page = blocks = img_list = img_bboxes = None # Drop page references before the next load_page
+            if processed_pages % STORE_SHRINK_PAGES == 0:
+                fitz.TOOLS.store_shrink(100) # Evict decoded images so the store doesn't grow per page
 
 
         doc.close() # Close the PDF document
@@ -848,7 +1470,9 @@ def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
 
         # --- Save Word Document ---
         output_path = get_output_filename(output_filename_base or Path(filename_for_log).stem, "converted", ".docx")
-        word_doc.save(str(output_path))
+        buffer = io.BytesIO()
+        word_doc.save(buffer) # zipfile emits many small writes, keep them in memory and write once
+        write_output_file(output_path, buffer.getbuffer())
         logger.info(f"Basic PDF-to-Word conversion saved to: {output_path}")
         return output_path, None
 
@@ -860,112 +1484,13 @@ def pdf_to_word(pdf_path_or_stream, output_filename_base="converted"):
         logger.error(f"Error converting PDF '{filename_for_log}' to Word: {e}", exc_info=True)
         if doc: doc.close()
         return None, f"Error converting PDF to Word: {e}"
-    finally:
-        if temp_pdf_path_obj:
-             cleanup_temp_file(temp_pdf_path_obj)
 
 # --- END PDF TO WORD ---
 
-# Major-Project/pdf_operations.py
-
-import os
-import fitz  # PyMuPDF
-from fitz.utils import getColor # Import getColor for named colors
-from pathlib import Path
-import logging
-from datetime import datetime
-
-logger = logging.getLogger(__name__)
-OUTPUT_DIR = Path("output") # Ensure this is defined as per your project structure
-
-# --- Helper Functions (ensure these exist or adapt) ---
-def ensure_output_dir():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_output_filename(base_name, suffix, extension):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
-    safe_base = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in str(base_name))
-    safe_base = safe_base[:100] # Limit base length
-    filename = f"{safe_base}_{suffix}_{timestamp}{extension}"
-    return OUTPUT_DIR / filename
-# --- End Helper Functions ---
-
-
-# Major-Project/pdf_operations.py
-
-import os
-import fitz  # PyMuPDF
-from fitz.utils import getColor
-from pathlib import Path
-import logging
-from datetime import datetime
-
-logger = logging.getLogger(__name__)
-OUTPUT_DIR = Path("output") # Ensure this is defined as per your project structure
-
-# --- Helper Functions (ensure these exist or adapt) ---
-def ensure_output_dir():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_output_filename(base_name, suffix, extension):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
-    safe_base = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in str(base_name))
-    safe_base = safe_base[:100] # Limit base length
-    filename = f"{safe_base}_{suffix}_{timestamp}{extension}"
-    return OUTPUT_DIR / filename
-# --- End Helper Functions ---
-
-# Major-Project/pdf_operations.py
-
-import os
-import fitz  # PyMuPDF
-from fitz.utils import getColor
-from pathlib import Path
-import logging
-from datetime import datetime
-
-logger = logging.getLogger(__name__)
-OUTPUT_DIR = Path("output") # Ensure this is defined
-
-# --- Helper Functions (ensure these exist or adapt) ---
-def ensure_output_dir():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_output_filename(base_name, suffix, extension):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
-    safe_base = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in str(base_name))
-    safe_base = safe_base[:100]
-    filename = f"{safe_base}_{suffix}_{timestamp}{extension}"
-    return OUTPUT_DIR / filename
-# --- End Helper Functions ---
-
-# Major-Project/pdf_operations.py
-
-import os
-import fitz  # PyMuPDF
-from fitz.utils import getColor
-from pathlib import Path
-import logging
-from datetime import datetime
-
-logger = logging.getLogger(__name__)
-OUTPUT_DIR = Path("output") # Ensure this is defined as per your project structure
-
-# --- Helper Functions (ensure these exist or adapt) ---
-def ensure_output_dir():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_output_filename(base_name, suffix, extension):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
-    safe_base = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in str(base_name))
-    safe_base = safe_base[:100] # Limit base length
-    filename = f"{safe_base}_{suffix}_{timestamp}{extension}"
-    return OUTPUT_DIR / filename
-# --- End Helper Functions ---
 
 def text_to_pdf(text_content: str, output_filename_base="text_document", font_name="cour", font_size=11):
     """
-    Generates a PDF from text_content using page.insert_text() line by line.
+    Generates a PDF from text_content, line by line, with one TextWriter per page.
     Uses black text on a white background. Includes detailed logging for multi-line processing.
     """
     ensure_output_dir()
@@ -978,10 +1503,10 @@ def text_to_pdf(text_content: str, output_filename_base="text_document", font_na
     white_color = getColor("white")
 
     logger.info(f"text_to_pdf (multiline_debug): Input text_content (first 200 chars): '{text_content[:200]}...'")
-    lines = text_content.split('\n')
+    lines = [ln.strip() for ln in text_content.split('\n')] # Stripped once up front, not per iteration
     logger.info(f"text_to_pdf (multiline_debug): Split into {len(lines)} lines.")
 
-    if not lines or (len(lines) == 1 and not lines[0].strip()): # Handle empty or effectively empty content
+    if not lines or (len(lines) == 1 and not lines[0]): # Handle empty or effectively empty content
         logger.warning("text_to_pdf (multiline_debug): No actual text lines to process.")
         # Create a blank PDF if no content
         try:
@@ -1006,43 +1531,37 @@ def text_to_pdf(text_content: str, output_filename_base="text_document", font_na
         line_height = font_size * 1.2
         x_coord = margin
         # Start y_cursor for the baseline of the first line of text
-        y_cursor = margin + font_size
-
-        for line_num, line in enumerate(lines):
-            # Prepare the line for processing
-            processed_line = line.strip() # Remove leading/trailing whitespace
-
-            logger.info(f"text_to_pdf (multiline_debug): --- Processing line {line_num + 1}/{len(lines)} ---")
-            logger.info(f"text_to_pdf (multiline_debug): Page: {page.number + 1}, Current y_cursor: {y_cursor:.2f}")
-            logger.info(f"text_to_pdf (multiline_debug): Line content (stripped): '{processed_line}'")
-
+        top_y = margin + font_size
+        y_cursor = top_y
+        page_bottom = page.rect.height - margin # Every page has the default size
+        font = fitz.Font(font_name) # Resolved once for the whole document
+        # Lines are collected per page and written as one text object when the page is done
+        writer = fitz.TextWriter(page.rect, color=black_color)
+        append = writer.append
+        debug = logger.isEnabledFor(logging.DEBUG) # Per-line logging only when asked for
+
+        for line_num, processed_line in enumerate(lines):
             # Page break logic: if the current y_cursor is already too far down for this line's baseline
-            if y_cursor > (page.rect.height - margin):
-                logger.info(f"text_to_pdf (multiline_debug): Page break triggered. y_cursor ({y_cursor:.2f}) > page_height ({page.rect.height}) - margin ({margin}).")
+            if y_cursor > page_bottom:
+                writer.write_text(page)
                 page = doc.new_page()
                 page.draw_rect(page.rect, color=white_color, fill=white_color, overlay=False)
-                y_cursor = margin + font_size  # Reset y_cursor for the new page
-                logger.info(f"text_to_pdf (multiline_debug): New page {page.number + 1} created. y_cursor reset to {y_cursor:.2f}.")
-
-            text_insertion_point = fitz.Point(x_coord, y_cursor)
+                writer = fitz.TextWriter(page.rect, color=black_color)
+                append = writer.append
+                y_cursor = top_y  # Reset y_cursor for the new page
+                if debug:
+                    logger.debug(f"text_to_pdf (multiline_debug): New page {page.number + 1} created. y_cursor reset to {y_cursor:.2f}.")
 
             # Only attempt to insert text if the processed line is not empty
             if processed_line:
-                insert_len = page.insert_text(
-                    text_insertion_point,
-                    processed_line,
-                    fontname=font_name,
-                    fontsize=font_size,
-                    color=black_color
-                )
-                logger.info(f"text_to_pdf (multiline_debug): Inserted '{processed_line[:50]}...' (len: {len(processed_line)}). PyMuPDF wrote {insert_len} chars.")
-                if insert_len < len(processed_line):
-                    logger.warning(f"text_to_pdf (multiline_debug): Line {line_num + 1}: Not all characters inserted.")
-            else:
-                logger.info(f"text_to_pdf (multiline_debug): Line {line_num + 1} is empty after strip, skipping text insertion.")
+                append((x_coord, y_cursor), processed_line, font=font, fontsize=font_size)
+                if debug:
+                    logger.debug(f"text_to_pdf (multiline_debug): Line {line_num + 1} on page {page.number + 1} at y={y_cursor:.2f}: '{processed_line[:50]}' (len: {len(processed_line)}).")
             
             y_cursor += line_height # Move to the next line position for the *next* iteration
 
+        writer.write_text(page) # Flush the last page
+
         doc.save(str(output_path))
         logger.info(f"PDF (multiline_debug) generated successfully: {output_path} with {doc.page_count} page(s).")
         return output_path, None
@@ -4,28 +4,215 @@ import os
 import logging
 from pathlib import Path
 import io # Needed for BytesIO
+import contextlib
+import math
+import re
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pdf_operations import OUTPUT_DIR
 
 # --- OCR Imports ---
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import tesserocr # In-process Tesseract API, the language model stays loaded across pages
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+try:
     import pytesseract
-    from pdf2image import convert_from_path, pdfinfo_from_path
-    OCR_AVAILABLE = True
+    PYTESSERACT_AVAILABLE = True
+    TESSERACT_NOT_FOUND_ERRORS = (pytesseract.TesseractNotFoundError,)
 except ImportError:
-    OCR_AVAILABLE = False
-    logging.warning("OCR dependencies (pytesseract, pdf2image, Pillow) not found. OCR functionality will be disabled.")
+    PYTESSERACT_AVAILABLE = False
+    TESSERACT_NOT_FOUND_ERRORS = ()
+
+OCR_AVAILABLE = Image is not None and (TESSEROCR_AVAILABLE or PYTESSERACT_AVAILABLE)
+if not OCR_AVAILABLE:
+    logging.warning("OCR dependencies (Pillow plus tesserocr or pytesseract) not found. OCR functionality will be disabled.")
 # --- End OCR Imports ---
 
 
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-# POPPLER_PATH can be set via environment variable or detected if needed by pdf2image
-POPPLER_PATH = os.environ.get('POPPLER_PATH', None)
+OCR_DPI = 200 # First-pass render resolution; enough for most pages
+OCR_RETRY_DPI = 400 # Pages whose OCR confidence is too low are rendered again at this resolution
+OCR_MIN_CONFIDENCE = 70 # Mean word confidence (0-100) below which a page is retried
+OCR_OEM = 1 # LSTM engine only, the legacy engine's data is never loaded
+OCR_PSM = 6 # Assume one uniform block of text per page; use 11 for sparse text (forms, slides)
+STORE_SHRINK_PAGES = 10 # Pages between MuPDF store evictions during direct text extraction
+SCAN_SAMPLE_MIN_CHARS = 30 # Below this much text on the sampled pages a PDF is treated as scanned
+OCR_PAGE_MIN_CHARS = 20 # Pages with images and less direct text than this are OCR'd individually (hybrid PDFs)
+OCR_MAX_WORKERS = 6 # Upper bound on OCR worker processes; scaling flattens out past this
+OCR_CACHE_DIR = OUTPUT_DIR / ".ocr_cache" # OCR results keyed by PDF content and OCR settings, next to the compress cache
+OCR_CACHE_MAX_ENTRIES = 256
+OCR_CHAR_FIXES = str.maketrans({"\ufb01": "fi", "\ufb02": "fl", "\ufb00": "ff", "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'})
+_OCR_HYPHEN_BREAK = re.compile(r"([^\W\d_])-\n([^\W\d_])") # Word hyphenated across a line break
+_OCR_SPACE_RUNS = re.compile(r"[ \t]+")
 # Set TESSERACT_CMD if needed (usually not required if Tesseract is in PATH)
 # pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
 
 
+def _iter_page_images(doc, page_numbers, dpi=OCR_DPI):
+    """Renders the given pages of an open document one at a time as grayscale PIL images for OCR.
+       Only one page bitmap is alive at a time: the pixmap is dropped before its image is handed out.
+    """
+    for page_num in page_numbers:
+        pix = doc.load_page(page_num).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        pix = None
+        yield img
+        img = None
+
+
+def _otsu_threshold(histogram):
+    """Returns the Otsu threshold (maximum between-class variance) for a 256-bin grayscale histogram."""
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    sum_bg = weight_bg = 0
+    best_threshold, best_variance = 0, -1.0
+    for i, h in enumerate(histogram):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_diff = sum_bg / weight_bg - (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * mean_diff * mean_diff
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    return best_threshold
+
+
+def _preprocess_for_ocr(img):
+    """Stretches contrast and binarizes a grayscale page with Otsu's threshold before OCR.
+       Clean black-on-white input gives Tesseract fewer candidates per character.
+    """
+    img = ImageOps.autocontrast(img.convert("L"))
+    threshold = _otsu_threshold(img.histogram())
+    return img.point([0 if i <= threshold else 255 for i in range(256)])
+
+
+def _tsv_to_text(data):
+    """Rebuilds page text from pytesseract image_to_data output and returns (text, mean word confidence).
+       Words are joined per line, with a blank line between paragraphs; confidence is None if no words were found.
+    """
+    paragraphs = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        conf = float(data['conf'][i])
+        if conf < 0 or not word.strip():
+            continue
+        confidences.append(conf)
+        lines = paragraphs.setdefault((data['block_num'][i], data['par_num'][i]), {})
+        lines.setdefault(data['line_num'][i], []).append(word)
+    text = "\n\n".join("\n".join(" ".join(words) for words in lines.values()) for lines in paragraphs.values())
+    return text, (sum(confidences) / len(confidences) if confidences else None)
+
+
+def _normalize_ocr_text(text):
+    """Cleans up the OCR text of one page: ligatures and curly quotes, words hyphenated
+       across lines, and runs of spaces/tabs.
+    """
+    text = _OCR_HYPHEN_BREAK.sub(r"\1\2", text.translate(OCR_CHAR_FIXES))
+    return _OCR_SPACE_RUNS.sub(" ", text)
+
+
+@contextlib.contextmanager
+def _ocr_engine(lang='eng'):
+    """Yields a function that OCRs one PIL image into (text, mean confidence). With tesserocr a single engine is created and reused
+       for every page; otherwise each page goes through the pytesseract subprocess.
+    """
+    if TESSEROCR_AVAILABLE:
+        with tesserocr.PyTessBaseAPI(lang=lang, oem=OCR_OEM, psm=OCR_PSM) as api:
+            def recognize(img):
+                api.SetImage(img)
+                text = api.GetUTF8Text()
+                return text, (api.MeanTextConf() if text.strip() else None)
+            yield recognize
+    else:
+        config = f"--oem {OCR_OEM} --psm {OCR_PSM}"
+        yield lambda img: _tsv_to_text(pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT))
+
+
+def _ocr_doc_pages(doc, page_numbers, lang='eng'):
+    """OCRs the given pages of an open document in order and returns (one text per page, failed page count).
+       A page that fails gets a placeholder; a missing Tesseract install is raised to the caller.
+    """
+    page_texts = []
+    failed_pages = 0
+    with _ocr_engine(lang) as recognize:
+        for page_num, img in zip(page_numbers, _iter_page_images(doc, page_numbers, OCR_DPI)):
+            logger.debug(f"Performing OCR on page {page_num + 1}...")
+            try:
+                text, confidence = recognize(_preprocess_for_ocr(img))
+                if confidence is not None and confidence < OCR_MIN_CONFIDENCE:
+                    logger.debug(f"Page {page_num + 1} OCR confidence {confidence:.0f}, retrying at {OCR_RETRY_DPI} DPI.")
+                    img = next(_iter_page_images(doc, [page_num], OCR_RETRY_DPI))
+                    retry_text, retry_confidence = recognize(_preprocess_for_ocr(img))
+                    if retry_confidence is not None and retry_confidence > confidence:
+                        text = retry_text
+                page_texts.append(text)
+            except TESSERACT_NOT_FOUND_ERRORS:
+                raise
+            except Exception as ocr_err:
+                logger.warning(f"Error during OCR on page {page_num + 1}: {ocr_err}. Skipping page.")
+                page_texts.append(f"[OCR Error on page {page_num + 1}]") # Add placeholder
+                failed_pages += 1
+            img = None # Drop this page's bitmap before the next one is rendered
+    return page_texts, failed_pages
+
+
+def _ocr_page_range(source, page_numbers, lang='eng'):
+    """Worker process entry point: opens the PDF (a path or the PDF bytes) and OCRs page_numbers.
+       Returns None if Tesseract is missing (TesseractNotFoundError can't be unpickled in the parent).
+    """
+    doc = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    with doc:
+        try:
+            return _ocr_doc_pages(doc, page_numbers, lang)
+        except TESSERACT_NOT_FOUND_ERRORS:
+            return None
+
+
+def _ocr_cache_path(source, lang, min_text_length_threshold):
+    """Cache file for the OCR text of source (a path or the PDF bytes) with the given settings."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    digest.update(f"|{OCR_DPI}|{OCR_RETRY_DPI}|{OCR_MIN_CONFIDENCE}|{lang}|{min_text_length_threshold}|{OCR_PAGE_MIN_CHARS}|otsu|norm-pages|{OCR_OEM}|{OCR_PSM}".encode())
+    return OCR_CACHE_DIR / f"{digest.hexdigest()}.txt"
+
+
+def _store_ocr_text(cache_path, text):
+    """Writes OCR text to the cache atomically, evicting the oldest entries past the limit."""
+    try:
+        OCR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=OCR_CACHE_DIR, prefix=".partial_")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+        entries = list(OCR_CACHE_DIR.glob("*.txt"))
+        if len(entries) > OCR_CACHE_MAX_ENTRIES:
+            entries.sort(key=lambda p: p.stat().st_mtime)
+            for old in entries[:len(entries) - OCR_CACHE_MAX_ENTRIES]:
+                old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not cache OCR text at {cache_path}: {e}") # Only costs a future cache hit
+
+
 def extract_text_with_ocr_fallback(pdf_path_or_stream, min_text_length_threshold=100) -> tuple[str | None, str | None]:
     """
     Extracts text content from a PDF file, attempting direct extraction first
@@ -42,7 +229,7 @@ def extract_text_with_ocr_fallback(pdf_path_or_stream, min_text_length_threshold
     """
     text = ""
     pdf_source_description = ""
-    temp_pdf_path_obj = None # To track temporary file if stream is input
+    doc = None
 
     try:
         # --- Stage 1: Attempt Direct Text Extraction (PyMuPDF) ---
@@ -56,6 +243,7 @@ def extract_text_with_ocr_fallback(pdf_path_or_stream, min_text_length_threshold
                 logger.error(err)
                 return None, err
             doc = fitz.open(pdf_source)
+            ocr_source = pdf_source
         elif isinstance(pdf_path_or_stream, (io.BytesIO, io.BufferedReader)):
              pdf_source_description = getattr(pdf_path_or_stream, 'filename', 'input_stream')
              # Read stream content for fitz
@@ -65,25 +253,58 @@ def extract_text_with_ocr_fallback(pdf_path_or_stream, min_text_length_threshold
              if not stream_bytes:
                   return None, "Input stream is empty."
              doc = fitz.open(stream=stream_bytes, filetype="pdf")
+             ocr_source = stream_bytes
         else:
             return None, "Invalid input type. Must be path string or stream."
 
-        logger.info(f"Processing {doc.page_count} pages in '{pdf_source_description}' for direct text extraction...")
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text("text") + "\n"
-        doc.close()
+        # Documents OCR'd before (re-uploads, retries) skip both extraction stages
+        cache_path = _ocr_cache_path(ocr_source, 'eng', min_text_length_threshold)
+        try:
+            cached_text = cache_path.read_text(encoding='utf-8')
+            logger.info(f"Using cached OCR text for '{pdf_source_description}' ({len(cached_text)} characters).")
+            return cached_text, None
+        except FileNotFoundError:
+            pass
 
-        text = text.strip()
-        logger.info(f"Direct extraction yielded {len(text)} characters.")
+        # Scanned documents end up in OCR anyway: sample first/middle/last page before parsing them all
+        page_count = doc.page_count
+        sample_pages = sorted({0, page_count // 2, page_count - 1})
+        looks_scanned = False
+        if OCR_AVAILABLE and page_count > len(sample_pages):
+            sample_text = "".join(doc.load_page(i).get_text("text") for i in sample_pages)
+            looks_scanned = len(sample_text.strip()) < SCAN_SAMPLE_MIN_CHARS
+
+        if looks_scanned:
+            logger.info(f"Sampled pages of '{pdf_source_description}' have no text layer, skipping direct extraction.")
+            parts = [""] * page_count
+            image_only_pages = list(range(page_count))
+        else:
+            logger.info(f"Processing {page_count} pages in '{pdf_source_description}' for direct text extraction...")
+            parts = [] # Joined once at the end instead of growing one string per page
+            image_only_pages = [] # Low-text pages that draw images, the only ones worth OCR in a text PDF
+            for page in doc.pages():
+                page_text = page.get_text("text")
+                if len(page_text.strip()) < OCR_PAGE_MIN_CHARS and page.get_images():
+                    image_only_pages.append(len(parts))
+                parts.append(page_text)
+                page = None # Let MuPDF drop the page before loading the next one
+                if len(parts) % STORE_SHRINK_PAGES == 0:
+                    fitz.TOOLS.store_shrink(100) # Evict cached fonts/images so long documents don't grow the store
 
-        # If direct extraction yielded enough text, return it
-        if len(text) >= min_text_length_threshold:
-            logger.info("Direct text extraction successful and sufficient.")
-            return text, None
+        text = "\n".join(parts).strip()
+        logger.info(f"Direct extraction yielded {len(text)} characters.")
 
-        # --- Stage 2: Fallback to OCR (if direct extraction insufficient and OCR available) ---
-        logger.info("Direct text extraction yielded insufficient text. Attempting OCR fallback...")
+        # --- Stage 2: Fallback to OCR (whole document if direct extraction insufficient, else image-only pages) ---
+        direct_sufficient = len(text) >= min_text_length_threshold
+        if direct_sufficient:
+            ocr_pages = image_only_pages # Blank separator pages and vector figures stay on the cheap path
+            if not ocr_pages or not OCR_AVAILABLE:
+                logger.info("Direct text extraction successful and sufficient.")
+                return text, None
+            logger.info(f"{len(ocr_pages)} of {page_count} pages have no text layer. Attempting OCR on those pages...")
+        else:
+            logger.info("Direct text extraction yielded insufficient text. Attempting OCR fallback...")
+            ocr_pages = list(range(page_count))
 
         if not OCR_AVAILABLE:
             warn = "OCR dependencies not available. Cannot perform OCR."
@@ -97,88 +318,63 @@ def extract_text_with_ocr_fallback(pdf_path_or_stream, min_text_length_threshold
                  return text, "Warning: Direct text extraction was minimal, OCR unavailable."
 
 
-        # OCR requires a file path, save stream to temp file if necessary
-        if isinstance(pdf_path_or_stream, (io.BytesIO, io.BufferedReader)):
-            # Save stream to a temporary file for pdf2image
-            temp_dir = Path("uploads") # Use uploads folder temporarily
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            temp_pdf_path_obj = temp_dir / f"ocr_temp_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf"
-            logger.info(f"Saving stream to temporary file for OCR: {temp_pdf_path_obj}")
-            try:
-                pdf_path_or_stream.seek(0)
-                with open(temp_pdf_path_obj, 'wb') as f_temp:
-                    f_temp.write(pdf_path_or_stream.read())
-                pdf_path_or_stream.seek(0) # Reset original stream
-                pdf_path_for_ocr = str(temp_pdf_path_obj)
-            except Exception as save_err:
-                 err = f"Failed to save stream to temporary file for OCR: {save_err}"
-                 logger.error(err, exc_info=True)
-                 return None, err
-        else:
-             pdf_path_for_ocr = pdf_source # Use the original path
-
-
-        # Perform OCR
+        # Perform OCR on pages rendered by PyMuPDF from the document that is already open
         logger.info(f"Starting OCR process for '{pdf_source_description}' using Tesseract...")
-        ocr_text_parts = []
         try:
-            # Check if PDF is valid before converting (optional but good)
+            workers = min(os.cpu_count() or 1, OCR_MAX_WORKERS, len(ocr_pages))
+            logger.info(f"Rendering {len(ocr_pages)} pages at {OCR_DPI} DPI (low-confidence pages again at {OCR_RETRY_DPI}) for OCR in {workers} process(es).")
             try:
-                 pdfinfo_from_path(pdf_path_for_ocr, poppler_path=POPPLER_PATH)
-            except Exception as pdfinfo_err:
-                 raise ValueError(f"Input file may not be a valid PDF or Poppler issue: {pdfinfo_err}") from pdfinfo_err
-
-            # Convert PDF to images
-            images = convert_from_path(pdf_path_for_ocr, dpi=300, poppler_path=POPPLER_PATH) # Higher DPI for better OCR
-            if not images:
-                raise RuntimeError("pdf2image failed to convert PDF pages to images.")
-
-            logger.info(f"Converted PDF to {len(images)} images for OCR.")
-
-            # Process each image with Tesseract
-            for i, img in enumerate(images):
-                logger.debug(f"Performing OCR on page {i+1}...")
-                try:
-                    # Specify English language ('eng') for Tesseract
-                    page_text = pytesseract.image_to_string(img, lang='eng')
-                    ocr_text_parts.append(page_text)
-                except pytesseract.TesseractNotFoundError:
-                     err = "Tesseract executable not found or not in PATH. Install Tesseract and check configuration."
-                     logger.error(err)
-                     # Cleanup temp file if created
-                     if temp_pdf_path_obj and temp_pdf_path_obj.exists():
-                         try: os.remove(temp_pdf_path_obj)
-                         except OSError: pass
-                     return None, err # Critical error, stop processing
-                except Exception as ocr_err:
-                     logger.warning(f"Error during OCR on page {i+1}: {ocr_err}. Skipping page.")
-                     ocr_text_parts.append(f"[OCR Error on page {i+1}]") # Add placeholder
-
-            # Combine text from all pages
-            text = "\n\n--- Page Break ---\n\n".join(ocr_text_parts).strip()
+                if workers <= 1:
+                    ocr_text_parts, failed_pages = _ocr_doc_pages(doc, ocr_pages, 'eng') # English ('eng')
+                else:
+                    # Contiguous page runs per worker, so each opens the PDF and starts an engine once
+                    chunk = math.ceil(len(ocr_pages) / workers)
+                    runs = [ocr_pages[start:start + chunk] for start in range(0, len(ocr_pages), chunk)]
+                    doc.close()
+                    doc = None
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        results = list(executor.map(_ocr_page_range, [ocr_source] * len(runs), runs)) # map keeps page order
+                    if None in results:
+                        raise pytesseract.TesseractNotFoundError()
+                    ocr_text_parts = [page_text for run_texts, _ in results for page_text in run_texts]
+                    failed_pages = sum(run_failed for _, run_failed in results)
+            except TESSERACT_NOT_FOUND_ERRORS:
+                err = "Tesseract executable not found or not in PATH. Install Tesseract and check configuration."
+                logger.error(err)
+                if direct_sufficient:
+                    return text, None # The text layer alone was already enough
+                return None, err # Critical error, stop processing
+
+            # Combine text from all pages, OCR text in place of the pages that were OCR'd;
+            # the text layer of the other pages is kept exactly as extracted
+            for page_num, page_text in zip(ocr_pages, ocr_text_parts):
+                parts[page_num] = _normalize_ocr_text(page_text)
+            separator = "\n" if direct_sufficient else "\n\n--- Page Break ---\n\n"
+            text = separator.join(parts).strip()
             logger.info(f"OCR process completed. Total characters extracted: {len(text)}")
 
             if not text:
                  # OCR completed but found no text
                  return None, "OCR process ran but extracted no text from the document images."
 
+            if failed_pages:
+                logger.warning(f"OCR failed on {failed_pages} page(s) of '{pdf_source_description}', not caching the result.")
+            else:
+                _store_ocr_text(cache_path, text) # Only complete results, a failed page is retried next time
             return text, None # Success via OCR
 
         except Exception as ocr_proc_err:
             logger.error(f"Error during OCR processing pipeline: {ocr_proc_err}", exc_info=True)
+            if direct_sufficient:
+                return text, None # The text layer alone was already enough
             return None, f"Error during OCR process: {ocr_proc_err}"
-        finally:
-            # Clean up temporary PDF file if it was created
-            if temp_pdf_path_obj and temp_pdf_path_obj.exists():
-                try:
-                    os.remove(temp_pdf_path_obj)
-                    logger.info(f"Removed temporary OCR file: {temp_pdf_path_obj}")
-                except OSError as e_rem:
-                    logger.warning(f"Could not remove temporary OCR file {temp_pdf_path_obj}: {e_rem}")
 
     except Exception as e:
         logger.error(f"General error extracting text from '{pdf_source_description}': {e}", exc_info=True)
         return None, f"Failed to extract text from PDF: {e}"
+    finally:
+        if doc is not None:
+            doc.close()
 
 # Original extract_text function is now replaced by extract_text_with_ocr_fallback
 # Keep the name simple for calling from app.py - maybe rename the function above to extract_text
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pikepdf
+
+import pdf_operations
+
+
+def _write_pdf(path, pages):
+    """Writes a PDF with the given number of blank pages."""
+    with pikepdf.Pdf.new() as pdf:
+        for _ in range(pages):
+            pdf.add_blank_page()
+        pdf.save(path)
+
+
+class MergeSizeLimitTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name) # OUTPUT_DIR is relative to the working directory
+        self.small_a = Path(self._tmp.name, "a.pdf")
+        self.small_b = Path(self._tmp.name, "b.pdf")
+        _write_pdf(self.small_a, 1)
+        _write_pdf(self.small_b, 2)
+        # Sparse file one byte over the limit: no real disk or memory use
+        self.oversized = Path(self._tmp.name, "oversized.pdf")
+        with open(self.oversized, "wb") as f:
+            f.truncate(pdf_operations.MAX_PDF_BYTES + 1)
+        self._streams = []
+
+    def tearDown(self):
+        for stream in self._streams:
+            stream.close()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def _open(self, path):
+        stream = open(path, "rb")
+        stream.filename = path.name
+        self._streams.append(stream)
+        return stream
+
+    def test_limit_not_above_app_upload_limit(self):
+        self.assertLessEqual(pdf_operations.MAX_PDF_BYTES, 100 * 1024 * 1024)
+
+    def test_oversized_input_is_skipped(self):
+        with self.assertLogs("pdf_operations", level="WARNING") as logs:
+            output_path, error = pdf_operations.merge_pdfs(
+                [self._open(self.small_a), self._open(self.oversized), self._open(self.small_b)])
+        self.assertIsNone(error)
+        self.assertTrue(any("oversized.pdf" in line and "exceeds" in line for line in logs.output))
+        with pikepdf.open(output_path) as merged:
+            self.assertEqual(len(merged.pages), 3)
+
+    def test_only_oversized_inputs_is_an_error(self):
+        output_path, error = pdf_operations.merge_pdfs([self._open(self.oversized)])
+        self.assertIsNone(output_path)
+        self.assertEqual(error, "No valid PDF files could be processed for merging.")
+
+
+if __name__ == "__main__":
+    unittest.main()